@@ -1,8 +1,20 @@
 from __future__ import annotations
 
+import io
+import os
+import ctypes
 import re
+import json
 import struct
+import tempfile
+import contextlib
+import subprocess
 import math
+import collections
+import hashlib
+import functools
+import itertools
+import operator
 import unicodedata
 import time
 import bpy
@@ -22,6 +34,13 @@ from CM3D2.Serialization.Performance import PerformanceExtensions  # type: ignor
 from System import Array  # type: ignore
 
 
+@compat.BlRegister()
+class CNV_PG_anm_export_action(bpy.types.PropertyGroup):
+    """An action listed for batch export"""
+    name      = bpy.props.StringProperty(name="Action")
+    is_export = bpy.props.BoolProperty(name="Export", default=False)
+
+
 # メインオペレーター
 @compat.BlRegister()
 class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
@@ -47,6 +66,20 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
     ]
     export_method = bpy.props.EnumProperty(items=items, name="Export Method", default='ALL')
 
+    items = [
+        ('TEXT_BLOCK', "Text Block", "JSON in the 'AnmData' text block"                , 'TEXT', 1),
+        ('FILE'      , "File"      , "Binary AnmData (.npz) or JSON AnmData (.json) file", 'FILE', 2),
+    ]
+    anm_data_source = bpy.props.EnumProperty(items=items, name="AnmData Source", default='TEXT_BLOCK')
+    anm_data_filepath = bpy.props.StringProperty(name="AnmData File", subtype='FILE_PATH', description="AnmData file exported from, .npz files are read as binary AnmData")
+    anm_data_dump_path = bpy.props.StringProperty(name="Dump AnmData", subtype='FILE_PATH', description="Also write the exported track data to this binary AnmData (.npz) file, which the text method can export again")
+
+    items = [
+        ('SERIALIZER', "CM3D2.Serialization", "Build an Anm object and serialize it through the .NET serializer", 'SCRIPT', 1),
+        ('NATIVE'    , "Native"             , "Pack the track data directly into the .anm file without building .NET objects", 'FILE', 2),
+    ]
+    serialization_backend = bpy.props.EnumProperty(items=items, name="Serialization Backend", default='SERIALIZER')
+
 
     frame_start = bpy.props.IntProperty(name="Start Frame", default=0, min=0, max=99999, soft_min=0, soft_max=99999, step=1)
     frame_end = bpy.props.IntProperty(name="End Frame", default=0, min=0, max=99999, soft_min=0, soft_max=99999, step=1)
@@ -55,6 +88,13 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
     is_keyframe_clean = bpy.props.BoolProperty(name="Clean Duplicate Keyframes", default=True)
     is_visual_transform = bpy.props.BoolProperty(name="Use Visual Transforms", default=True )
     is_smooth_handle = bpy.props.BoolProperty(name="Smooth Interpolation", default=True)
+    is_batched_sampling = bpy.props.BoolProperty(name="Batched Pose Sampling", default=False, description="Sample all bones of a frame at once and convert them with array operations. Values can differ from per-bone sampling in the last float digits")
+    sampling_workers = bpy.props.IntProperty(name="Sampling Workers", default=1, min=1, max=64, description="Split the frame range across this many background Blender processes (1 = sample in this session)")
+    is_isolated_evaluation = bpy.props.BoolProperty(name="Evaluate Armature Only", default=False, description="Temporarily disable objects the armature does not depend on while sampling frames")
+    is_track_cache = bpy.props.BoolProperty(name="Reuse Unchanged Bone Tracks", default=False, description="Keep finished bone tracks in memory and only sample again the bones whose animation or settings changed since the last export")
+    track_cache_size = bpy.props.IntProperty(name="Track Cache Size (MB)", default=256, min=16, max=16384, description="Memory kept for reused bone tracks, the least recently used ones are dropped first")
+    is_sample_cache = bpy.props.BoolProperty(name="Cache Samples on Disk", default=False, description="Store the sampled pose of every frame in a folder next to the .blend, so exports with other optimization settings skip sampling")
+    is_keyed_read_only = bpy.props.BoolProperty(name="Read-Only Keyframes", default=False, description="Compute keyframe values and tangents from the FCurves without copying and converting the action. Tangents of keyframes that are not Bezier or Linear are approximated")
 
     items = [
         ('ARMATURE', "Armature", "Use armature bone hierarchy", 'OUTLINER_OB_ARMATURE', 1),
@@ -79,7 +119,8 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
         ('SIMPLE', "Simple Sampling", "Sample every Nth frame uniformly", 'MOD_DECIM', 1),
         ('DENSITY', "Smart Density", "Adaptive sampling based on bone keyframe density", 'FILTER', 2),
         ('MOTION', "Motion Analysis", "Advanced motion-based keyframe detection (experimental)", 'TRACKING', 3),
-        ('RDP', "RDP Algorithm", "Ramer-Douglas-Peucker curve simplification (mathematical optimal)", 'MESH_DATA', 4)
+        ('RDP', "RDP Algorithm", "Ramer-Douglas-Peucker curve simplification (mathematical optimal)", 'MESH_DATA', 4),
+        ('HERMITE', "Hermite Fit", "Sample every frame, then fit keyframes and their tangents to the curve within a tolerance", 'IPO_BEZIER', 5),
     ]
     direct_optimization_mode     = bpy.props.EnumProperty(items=items, name="Optimization Mode", default='DENSITY', description="Method used for keyframe reduction")
     
@@ -97,6 +138,26 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
     # RDP mode options
     direct_rdp_tolerance         = bpy.props.FloatProperty(name="RDP Tolerance", default=0.01, min=0.001, max=1.0, step=0.001, precision=3, description="Maximum deviation allowed - lower = higher quality, larger files")
     direct_rdp_min_distance      = bpy.props.IntProperty(name="Min Frame Distance", default=2, min=1, max=10, step=1, description="Minimum frames between keyframes")
+    
+    # Hermite mode options
+    direct_hermite_tolerance     = bpy.props.FloatProperty(name="Fit Tolerance", default=0.0005, min=0.00001, max=0.1, step=0.01, precision=5, description="Maximum deviation of the fitted curve from the sampled values (CM3D2 units)")
+    
+    # Per-channel keys
+    direct_per_channel_keys      = bpy.props.BoolProperty(name="Per-Channel Keys", default=True, description="Choose keyframe times separately for every output channel instead of keying all bones at the same times")
+    direct_channel_tolerance     = bpy.props.FloatProperty(name="Channel Tolerance", default=0.0005, min=0.0, max=0.1, step=0.01, precision=4, description="Maximum deviation of a channel from the line through its remaining keyframes (CM3D2 units)")
+
+    # Batch export
+    items = [
+        ('NONE'      , "Active Action", "Export the active action to the chosen file"                                   , 'ACTION'     , 1),
+        ('ACTIONS'   , "Actions"      , "Export each checked action to its own file in the chosen folder, over the action's own frame range", 'DOCUMENTS'  , 2),
+        ('NLA_STRIPS', "NLA Strips"   , "Export the action of every NLA strip of the armature to its own file in the chosen folder, over the action's own frame range", 'NLA', 3),
+    ]
+    batch_mode    = bpy.props.EnumProperty(items=items, name="Batch Export", default='NONE', description="Export several actions at once. Each file covers the frame range of its action, the Start and End Frame settings are ignored")
+    batch_actions = bpy.props.CollectionProperty(type=CNV_PG_anm_export_action)
+
+    # Diagnostics
+    is_profile       = bpy.props.BoolProperty(name="Profile Export", default=False, description="Measure the time of each export stage and report a summary")
+    profile_log_path = bpy.props.StringProperty(name="Profile Log", subtype='FILE_PATH', default="", description="Append a JSON line with the measurements to this file (optional)")
 
     @classmethod
     def poll(cls, context):
@@ -128,6 +189,13 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
             self.bone_parent_from = 'ARMATURE_PROPERTY'
         else:
             self.bone_parent_from = 'ARMATURE'
+        
+        self.batch_actions.clear()
+        active_action = ob.animation_data.action if ob.animation_data else None
+        for action in context.blend_data.actions:
+            item = self.batch_actions.add()
+            item.name = action.name
+            item.is_export = action == active_action
 
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
@@ -143,6 +211,13 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
         box = self.layout.box()
         box.label(text="Export Method")
         box.prop(self, 'export_method', expand=True)
+        if self.export_method == 'TEXT':
+            box.prop(self, 'anm_data_source', expand=True)
+            if self.anm_data_source == 'FILE':
+                box.prop(self, 'anm_data_filepath')
+        else:
+            box.prop(self, 'serialization_backend')
+            box.prop(self, 'anm_data_dump_path', icon='FILE')
 
         box = self.layout.box()
         box.enabled = not (self.export_method == 'TEXT')
@@ -157,6 +232,14 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
             row.prop(self, 'frame_start')
             row.prop(self, 'frame_end')
             sub_box.prop(self, 'is_smooth_handle', icon='SMOOTHCURVE')
+            sub_box.prop(self, 'is_batched_sampling', icon='MOD_ARRAY')
+            if self.is_batched_sampling:
+                sub_box.prop(self, 'sampling_workers', icon='SYSTEM')
+                sub_box.prop(self, 'is_track_cache', icon='FILE_REFRESH')
+                if self.is_track_cache:
+                    sub_box.prop(self, 'track_cache_size')
+                sub_box.prop(self, 'is_sample_cache', icon='DISK_DRIVE')
+            sub_box.prop(self, 'is_isolated_evaluation', icon='ARMATURE_DATA')
             
             # File size vs quality option
             size_box = sub_box.box()
@@ -183,6 +266,16 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
             sub_box.prop(self, 'key_frame_count')
             sub_box.prop(self, 'is_keyframe_clean', icon='DISCLOSURE_TRI_DOWN')
             sub_box.prop(self, 'is_smooth_handle', icon='SMOOTHCURVE')
+            sub_box.prop(self, 'is_batched_sampling', icon='MOD_ARRAY')
+            if self.is_batched_sampling:
+                sub_box.prop(self, 'sampling_workers', icon='SYSTEM')
+                sub_box.prop(self, 'is_track_cache', icon='FILE_REFRESH')
+                if self.is_track_cache:
+                    sub_box.prop(self, 'track_cache_size')
+                sub_box.prop(self, 'is_sample_cache', icon='DISK_DRIVE')
+            sub_box.prop(self, 'is_isolated_evaluation', icon='ARMATURE_DATA')
+            if self.export_method == 'KEYED':
+                box.prop(self, 'is_keyed_read_only', icon='LOCKED')
 
         sub_box = box.box()
         sub_box.label(text="Bone Parent Source", icon='FILE_PARENT')
@@ -243,6 +336,31 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
                     rdp_box.prop(self, 'direct_rdp_tolerance', icon='MESH_DATA')
                     rdp_box.prop(self, 'direct_rdp_min_distance', icon='DRIVER_DISTANCE')
                     rdp_box.label(text="Lower tolerance = higher quality", icon='HELP')
+                    
+                elif self.direct_optimization_mode == 'HERMITE':
+                    hermite_box = opt_box.box()
+                    hermite_box.prop(self, 'direct_hermite_tolerance', icon='IPO_BEZIER')
+                    hermite_box.label(text="Tangents are fitted, Smooth Handle is ignored", icon='INFO')
+                
+                if self.direct_optimization_mode != 'HERMITE':
+                    opt_box.prop(self, 'direct_per_channel_keys', icon='IPO_LINEAR')
+                    if self.direct_per_channel_keys:
+                        opt_box.prop(self, 'direct_channel_tolerance', icon='MESH_DATA')
+        
+        if self.export_method != 'TEXT':
+            box = self.layout.box()
+            box.prop(self, 'batch_mode')
+            if self.batch_mode == 'ACTIONS':
+                column = box.column(align=True)
+                for item in self.batch_actions:
+                    column.prop(item, 'is_export', text=item.name, icon='ACTION')
+            if self.batch_mode != 'NONE':
+                box.label(text="Files are named after the actions", icon='INFO')
+        
+        box = self.layout.box()
+        box.prop(self, 'is_profile', icon='TIME')
+        if self.is_profile:
+            box.prop(self, 'profile_log_path', text="")
         
         file_select_params: bpy.types.FileSelectParams = None
         try:
@@ -277,6 +395,11 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
             return {'CANCELLED'}
         
         common.preferences().anm_export_path = self.filepath
+        
+        self.profiler = ExportProfiler() if self.is_profile else None
+        
+        if self.batch_mode != 'NONE' and self.export_method != 'TEXT':
+            return self.execute_batch(context)
 
         try:
             file = common.open_temporary(self.filepath, 'wb', is_backup=self.is_backup)
@@ -289,34 +412,167 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
 
         try:
             with file:
-                if self.export_method == 'TEXT':
-                    self.write_animation_from_text(context, file)
-                elif self.export_method == 'DIRECT':
-                    self.write_animation_direct_method(context, file)
-                else:
-                    builder = self.get_anm_builder()
-                    anm = builder.build_anm(context)
-                    serialize_to_file(anm, file)
+                self.write_animation(context, file)
         except common.CM3D2ExportError as e:
             self.report(type={'ERROR'}, message=str(e))
             return {'CANCELLED'}
 
+        if self.profiler:
+            self.report_profile()
+
         return {'FINISHED'}
+    
+    def write_animation(self, context, file, builder: AnmBuilder | None = None):
+        """Write the animation with the selected export method, reusing builder if given"""
+        if self.export_method == 'TEXT':
+            with ExportProfiler.measure(self.profiler, 'write_animation_from_text'):
+                self.write_animation_from_text(context, file)
+        elif self.export_method == 'DIRECT':
+            self.write_animation_direct_method(context, file, builder)
+        else:
+            builder = builder or self.get_anm_builder()
+            if self.serialization_backend == 'NATIVE':
+                builder.write_anm(context, file)
+            else:
+                anm = builder.build_anm(context)
+                with ExportProfiler.measure(self.profiler, 'serialize'):
+                    serialize_to_file(anm, file)
+    
+    def get_batch_actions(self, obj: bpy.types.Object) -> list[bpy.types.Action]:
+        if self.batch_mode == 'ACTIONS':
+            actions = bpy.data.actions
+            return [actions[item.name] for item in self.batch_actions if item.is_export and item.name in actions]
+        
+        actions = []
+        if obj.animation_data:
+            for track in obj.animation_data.nla_tracks:
+                for strip in track.strips:
+                    if strip.action and strip.action not in actions:
+                        actions.append(strip.action)
+        return actions
+    
+    def execute_batch(self, context):
+        """Export several actions of the active armature, one file each, with one builder"""
+        obj = context.active_object
+        actions = self.get_batch_actions(obj)
+        if not actions:
+            self.report(type={'ERROR'}, message="There are no actions to export")
+            return {'CANCELLED'}
+        
+        directory = os.path.dirname(bpy.path.abspath(self.filepath))
+        extension = '.ex.anm' if self.filepath.endswith('.ex.anm') else self.filename_ext
+        builder = self.get_direct_anm_builder() if self.export_method == 'DIRECT' else self.get_anm_builder()
+        
+        is_anim_data_created = obj.animation_data is None
+        anim_data = obj.animation_data_create() if is_anim_data_created else obj.animation_data
+        original_action = anim_data.action
+        original_use_nla = anim_data.use_nla
+        # Only the swapped-in action should be evaluated
+        anim_data.use_nla = False
+        
+        started = time.perf_counter()
+        exported = []
+        used_names = set()
+        try:
+            for action in actions:
+                anim_data.action = action
+                builder.frame_start, builder.frame_end = (int(frame) for frame in action.frame_range)
+                # The whole name is kept, "walk" and "walk.001" must not overwrite each other
+                name = re.sub(r'[\\/:*?"<>|]', '_', action.name)
+                unique_name, index = name, 1
+                while unique_name.lower() in used_names:
+                    index += 1
+                    unique_name = f"{name}_{index}"
+                if unique_name != name:
+                    self.report(type={'WARNING'}, message=f"{action.name}: file name already used, exported as {unique_name + extension}")
+                used_names.add(unique_name.lower())
+                filepath = os.path.join(directory, unique_name + extension)
+                try:
+                    file = common.open_temporary(filepath, 'wb', is_backup=self.is_backup)
+                except:
+                    self.report(
+                        type={'ERROR'},
+                        message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", filepath)
+                    )
+                    continue
+                try:
+                    with file:
+                        self.write_animation(context, file, builder)
+                except common.CM3D2ExportError as e:
+                    self.report(type={'WARNING'}, message=f"{action.name}: {e}")
+                    continue
+                exported.append(filepath)
+        finally:
+            if is_anim_data_created:
+                obj.animation_data_clear()
+            else:
+                anim_data.action = original_action
+                anim_data.use_nla = original_use_nla
+        
+        elapsed = time.perf_counter() - started
+        self.report(
+            type={'INFO'},
+            message=f"Exported {len(exported)} of {len(actions)} animations to {directory} in {elapsed:.2f}s ({elapsed / len(actions):.2f}s each)"
+        )
+        if self.profiler:
+            self.report_profile()
+        return {'FINISHED'} if exported else {'CANCELLED'}
+
+    def report_profile(self):
+        profiler = self.profiler
+        if 'bytes_written' not in profiler.counters and self.batch_mode == 'NONE' and os.path.exists(self.filepath):
+            profiler.count('bytes_written', os.path.getsize(self.filepath))
+        self.report(type={'INFO'}, message=profiler.summary())
+        if self.profile_log_path:
+            profiler.append_log(
+                bpy.path.abspath(self.profile_log_path),
+                filepath              = self.filepath,
+                export_method         = self.export_method,
+                optimization_mode     = self.direct_optimization_mode if self.export_method == 'DIRECT' else None,
+                serialization_backend = self.serialization_backend,
+            )
 
     def write_animation_OLD(self, context, file):
         """Legacy manual binary serialization method (deprecated)"""
         # Original implementation removed - use write_animation_direct_method() instead
         pass
 
-    def write_animation_direct_method(self, context, file):
+    def write_animation_direct_method(self, context, file, builder: AnmBuilder | None = None):
         """Direct serialization using AnmBuilder + CM3D2Serializer pipeline"""
-        try:
-            from CM3D2.Serialization import CM3D2Serializer
-            from System.IO import MemoryStream
-        except ImportError as e:
-            raise common.CM3D2ExportError(f"Required serialization libraries not available: {e}")
+        if self.serialization_backend != 'NATIVE':
+            try:
+                from CM3D2.Serialization import CM3D2Serializer
+                from System.IO import MemoryStream
+            except ImportError as e:
+                raise common.CM3D2ExportError(f"Required serialization libraries not available: {e}")
+        
+        builder = builder or self.get_direct_anm_builder()
+        
+        if self.serialization_backend == 'NATIVE':
+            size = builder.write_anm(context, file)
+            self.report(type={'INFO'}, message=f"Animation exported via native serialization ({size} bytes)")
+            return
         
+        anm = builder.build_anm(context)
+        
+        with ExportProfiler.measure(self.profiler, 'serialize'):
+            # Serialize and convert to Python bytes
+            serializer = CM3D2Serializer()
+            memory_stream = MemoryStream()
+            serializer.Serialize(memory_stream, anm)
+            
+            # Optimized: Use ToArray() for better performance than Array.Copy()
+            python_buffer = bytes(memory_stream.ToArray())
+            
+            file.write(python_buffer)
+        if self.profiler:
+            self.profiler.count('bytes_written', len(python_buffer))
+        
+        self.report(type={'INFO'}, message=f"Animation exported via direct serialization ({len(python_buffer)} bytes)")
+
+    def get_direct_anm_builder(self) -> AnmBuilder:
         builder = AnmBuilder(reporter=self)
+        builder.profiler = self.profiler
         builder.scale = self.scale
         builder.version = self.version
         builder.frame_start = self.frame_start
@@ -337,59 +593,50 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
         builder.time_gap_limit = self.direct_time_gap_limit
         builder.rdp_tolerance = self.direct_rdp_tolerance
         builder.rdp_min_distance = self.direct_rdp_min_distance
+        builder.is_per_channel_keys = self.direct_per_channel_keys
+        builder.channel_tolerance = self.direct_channel_tolerance
+        builder.hermite_tolerance = self.direct_hermite_tolerance
         
         # Direct serialization settings
         builder.is_keyframe_clean = False
         builder.is_smooth_handle = self.is_smooth_handle
+        builder.is_batched_sampling = self.is_batched_sampling
+        builder.is_isolated_evaluation = self.is_isolated_evaluation
+        builder.sampling_workers = self.sampling_workers
+        builder.is_track_cache = self.is_track_cache
+        builder.track_cache_bytes = self.track_cache_size * 1024 * 1024
+        builder.is_sample_cache = self.is_sample_cache
+        builder.anm_data_path = bpy.path.abspath(self.anm_data_dump_path) if self.anm_data_dump_path else ''
         builder.is_remove_alone_bone = self.is_remove_alone_bone
         builder.is_remove_ik_bone = self.is_remove_ik_bone
         builder.is_remove_serial_number_bone = self.is_remove_serial_number_bone
         builder.is_remove_japanese_bone = self.is_remove_japanese_bone
-        
-        anm = builder.build_anm(context)
-        
-        # Serialize and convert to Python bytes
-        serializer = CM3D2Serializer()
-        memory_stream = MemoryStream()
-        serializer.Serialize(memory_stream, anm)
-        
-        # Optimized: Use ToArray() for better performance than Array.Copy()
-        python_buffer = bytes(memory_stream.ToArray())
-        
-        file.write(python_buffer)
-        
-        self.report(type={'INFO'}, message=f"Animation exported via direct serialization ({len(python_buffer)} bytes)")
+        return builder
 
     def write_animation_from_text(self, context, file):
-        txt = context.blend_data.texts.get("AnmData")
-        if not txt:
-            raise common.CM3D2ExportError("There is no 'AnmData' text file.")
-
-        import json
-        anm_data = json.loads(txt.as_string())
+        if self.anm_data_source == 'FILE':
+            path = bpy.path.abspath(self.anm_data_filepath)
+            if not os.path.isfile(path):
+                raise common.CM3D2ExportError(f"AnmData file not found: {path}")
+            if path.lower().endswith('.npz'):
+                tracks = [pack_anm_data_track(track_path, channels) for _, track_path, channels in load_anm_data(path)]
+            else:
+                tracks = pack_text_tracks(Path(path).read_text(encoding='utf-8-sig'))
+        else:
+            txt = context.blend_data.texts.get("AnmData")
+            if not txt:
+                raise common.CM3D2ExportError("There is no 'AnmData' text file.")
+            tracks = pack_text_tracks(txt.as_string())
 
         common.write_str(file, 'CM3D2_ANIM')
-        file.write(struct.pack('<i', self.version))
-
-        for base_bone_name, bone_data in anm_data.items():
-            path = bone_data['path']
-            file.write(struct.pack('<?', True))
-            common.write_str(file, path)
-
-            for channel_id, channel in bone_data['channels'].items():
-                file.write(struct.pack('<B', int(channel_id)))
-                channel_data_count = len(channel)
-                file.write(struct.pack('<i', channel_data_count))
-                for channel_data in channel:
-                    frame = channel_data['frame']
-                    data = ( channel_data['f0'], channel_data['f1'], channel_data['f2'] )
-                    file.write(struct.pack('<f' , frame))
-                    file.write(struct.pack('<3f', *data ))
-
-        file.write(struct.pack('<?', False))
+        file.write(_INT32.pack(self.version))
+        for track in tracks:
+            file.write(track)
+        file.write(_BOOL.pack(False))
 
     def get_anm_builder(self) -> AnmBuilder:
         builder = AnmBuilder(reporter=self)
+        builder.profiler                     = self.profiler
         builder.scale                        = self.scale
         builder.version                      = self.version
         builder.export_method                = self.export_method
@@ -400,6 +647,14 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
         builder.is_keyframe_clean            = self.is_keyframe_clean
         builder.is_visual_transform          = self.is_visual_transform
         builder.is_smooth_handle             = self.is_smooth_handle
+        builder.is_batched_sampling          = self.is_batched_sampling
+        builder.is_isolated_evaluation       = self.is_isolated_evaluation
+        builder.is_keyed_read_only           = self.is_keyed_read_only
+        builder.sampling_workers             = self.sampling_workers
+        builder.is_track_cache               = self.is_track_cache
+        builder.track_cache_bytes            = self.track_cache_size * 1024 * 1024
+        builder.is_sample_cache              = self.is_sample_cache
+        builder.anm_data_path                = bpy.path.abspath(self.anm_data_dump_path) if self.anm_data_dump_path else ''
         builder.bone_parent_from             = self.bone_parent_from
         builder.is_location                  = self.is_location
         builder.is_rotation                  = self.is_rotation
@@ -414,6 +669,11 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
     
 
 class AnmBuilder:
+    # (channel, component) pairs; quaternion components are w, x, y, z
+    LOC_CHANNELS = ((Anm.ChannelIdType.LocalPositionX, 0), (Anm.ChannelIdType.LocalPositionY, 1), (Anm.ChannelIdType.LocalPositionZ, 2))
+    ROT_CHANNELS = ((Anm.ChannelIdType.LocalRotationX, 1), (Anm.ChannelIdType.LocalRotationY, 2), (Anm.ChannelIdType.LocalRotationZ, 3), (Anm.ChannelIdType.LocalRotationW, 0))
+    SCL_CHANNELS = ((Anm.ChannelIdType.ExLocalScaleX, 0), (Anm.ChannelIdType.ExLocalScaleY, 1), (Anm.ChannelIdType.ExLocalScaleZ, 2))
+    
     def __init__(self, reporter: bpy.types.Operator):
         self.reporter = reporter
         
@@ -427,6 +687,15 @@ class AnmBuilder:
         self.is_keyframe_clean = True
         self.is_visual_transform = True
         self.is_smooth_handle = True
+        self.is_batched_sampling = False
+        self.is_isolated_evaluation = False
+        self.sampling_workers = 1
+        self.is_track_cache = False
+        self.track_cache_bytes = 256 * 1024 * 1024
+        self.is_sample_cache = False
+        self.anm_data_path = '' # Binary AnmData dump of the track data, off when empty
+        self.is_bulk_keyframe_transfer = True
+        self.is_keyed_read_only = False
         self.bone_parent_from = 'ARMATURE_PROPERTY'
         self.is_location = True
         self.is_rotation = True
@@ -437,206 +706,634 @@ class AnmBuilder:
         self.is_remove_serial_number_bone = True
         self.is_remove_japanese_bone      = True
         
+        # DIRECT_OPTIMIZED keyframe selection
+        self.optimization_mode = 'DENSITY'
+        self.simple_step       = 2
+        self.density_threshold = 0.8
+        self.dense_reduction   = 2
+        self.motion_threshold  = 0.001
+        self.time_gap_limit    = 10
+        self.rdp_tolerance     = 0.01
+        self.rdp_min_distance  = 2
+        self.is_per_channel_keys = True
+        self.channel_tolerance   = 0.0005
+        self.hermite_tolerance   = 0.0005
         
         self.no_set_frame = False
         
+        self.profiler: ExportProfiler | None = None
+        
         self._invalid_bones: dict[bpy.types.PoseBone, list[tuple(float, Matrix)]] = dict()
     
     def build_anm(self, context) -> Anm:
+        bone_parents, bones, track_data, time_step = self.build_track_data(context)
+        if self.anm_data_path:
+            self.dump_anm_data(self.anm_data_path, bone_parents, bones, track_data, time_step, auto_smooth=self.is_auto_smooth)
+        
+        with self._stage('assemble_anm'):
+            anm = self.assemble_anm(
+                bone_parents, bones, track_data, time_step,
+                auto_smooth=self.is_auto_smooth
+            )
+
+        return anm
+    
+    def write_anm(self, context, file) -> int:
+        """Build the animation and write it with the native writer, returns the number of bytes written"""
+        if self.is_streamable and not self.is_incremental and not self.anm_data_path:
+            return self.write_anm_streaming(context, file)
+        
+        bone_parents, bones, track_data, time_step = self.build_track_data(context)
+        if self.anm_data_path:
+            self.dump_anm_data(self.anm_data_path, bone_parents, bones, track_data, time_step, auto_smooth=self.is_auto_smooth)
+        
+        with self._stage('write_anm_data'):
+            size = self.write_anm_data(
+                file, bone_parents, bones, track_data, time_step,
+                auto_smooth=self.is_auto_smooth
+            )
+        self._count('bytes_written', size)
+        return size
+    
+    @property
+    def is_streamable(self) -> bool:
+        return ((self.export_method == 'ALL' or self.export_method == 'DIRECT_OPTIMIZED')
+                and self.is_batched_sampling and PoseSampler.is_supported())
+    
+    @property
+    def is_incremental(self) -> bool:
+        """Whether finished bone tracks are looked up in TrackCache before sampling"""
+        return self.is_track_cache and self.is_streamable
+    
+    def write_anm_streaming(self, context, file) -> int:
+        """Same output as write_anm(), but each track is finished and written before the next one is built.
+        
+        Pose matrices are read and converted in blocks of PoseSampler.CONVERT_BLOCK_FRAMES
+        frames, so what stays alive for the whole export is the float32 loc/rot/scale
+        samples (40 bytes per bone and frame) and the keep masks, plus one bone's track.
+        Background workers return all matrices at once, which adds 64 bytes per bone and
+        frame until they are converted.
+        """
+        obj = context.active_object
+        arm = obj.data
+        
+        with self._stage('get_bone_parents'):
+            bone_parents = self.get_bone_parents(arm, self.bone_parent_from == 'ARMATURE_PROPERTY')
+        
+        with self._stage('clean_bone_list'):
+            fcurves = None
+            keyed_bones = None
+            if self.check_animation_data(obj):
+                fcurves = obj.animation_data.action.fcurves
+                keyed_bones = self.get_keyed_bones(arm, fcurves)
+            bones = self.clean_bone_list(arm, bone_parents, keyed_bones)
+        self._count('bones_in', len(arm.bones))
+        self._count('bones_out', len(bones))
+        self._count_keyframes_in(bones, fcurves)
+        
+        with self._stage('select_frames'):
+            frames, is_keyframe_clean = self.select_frames(bones, fcurves)
+        
+        with self._stage('sample'), self.evaluation_scope(context, obj):
+            locs, rots, scls, valid = self.sample_pose_arrays(context, obj.pose, bones, bone_parents, frames)
+        self.report_invalid_bones()
+        
+        fps = context.scene.render.fps
+        time_step = 1 / fps * (1.0 / self.time_scale)
+        times = np.array([(frame - self.frame_start) / fps * (1.0 / self.time_scale) for frame in frames], dtype=np.float64)
+        auto_smooth = self.is_auto_smooth
+        bone_paths = self.get_bone_paths(bones, bone_parents)
+        
+        with self._stage('clean_keyframes'):
+            masks = self.get_keep_masks(locs, rots, scls, valid, is_keyframe_clean)
+        
+        with self._stage('write_tracks'):
+            size = self.write_header(file)
+            
+            kept = total = 0
+            for bone_index, bone in enumerate(bones):
+                channels = self.get_channels_from_arrays(bone_index, times, (locs, rots, scls), masks)
+                if self.is_optimizing_channel_keys:
+                    bone_kept, bone_total = self.optimize_channel_keys([channels], fps)
+                    kept, total = kept + bone_kept, total + bone_total
+                if channels:
+                    size += self.write_track(file, bone_paths[bone.name], channels, time_step, auto_smooth)
+            
+            size += self.write_footer(file)
+        if self.is_optimizing_channel_keys:
+            self.report_channel_reduction(kept, total)
+        self._count('bytes_written', size)
+        return size
+    
+    def select_frames(self, bones, fcurves) -> tuple[list[float], bool]:
+        """Frames sampled by the batched ALL / DIRECT_OPTIMIZED paths and whether they are cleaned afterwards"""
+        if self.export_method == 'ALL':
+            return self.get_sample_frames(), self.is_keyframe_clean
+        return self.get_direct_keyframe_times(bones, fcurves), False
+    
+    def build_track_data(self, context):
         obj = context.active_object
         arm = obj.data
         
-        bone_parents = self.get_bone_parents(arm, self.bone_parent_from == 'ARMATURE_PROPERTY')
+        with self._stage('get_bone_parents'):
+            bone_parents = self.get_bone_parents(arm, self.bone_parent_from == 'ARMATURE_PROPERTY')
         
-        bones, anm_data_raw = self.collect_raw_animation_data(context, obj, bone_parents)
+        if self.is_incremental:
+            return self.build_track_data_incremental(context, obj, bone_parents)
+        
+        with self._stage('collect_raw_animation_data'), self.evaluation_scope(context, obj):
+            bones, anm_data_raw = self.collect_raw_animation_data(context, obj, bone_parents)
+        self._count('bones_in', len(arm.bones))
+        self._count('bones_out', len(bones))
+        self._count_keyframes_in(bones, obj.animation_data.action.fcurves if self.check_animation_data(obj) else None)
 
         fps = context.scene.render.fps
         time_step = 1 / fps * (1.0 / self.time_scale)
         
-        track_data = self.get_track_data(anm_data_raw)
+        with self._stage('get_track_data'):
+            track_data = self.get_track_data(anm_data_raw)
+        
+        if self.is_optimizing_channel_keys:
+            with self._stage('optimize_channel_keys'):
+                kept, total = self.optimize_channel_keys(track_data.values(), fps)
+            self.report_channel_reduction(kept, total)
+        
+        return bone_parents, bones, track_data, time_step
+    
+    def build_track_data_incremental(self, context, obj: bpy.types.Object, bone_parents):
+        """build_track_data() that reuses the finished tracks of bones whose fingerprint is in TrackCache.
+        
+        Only the remaining bones are sampled, cleaned and reduced. Every step after the
+        frame selection works on each bone on its own, so the result is the same as
+        building all tracks again.
+        """
+        arm = obj.data
+        
+        with self._stage('clean_bone_list'):
+            fcurves = None
+            keyed_bones = None
+            if self.check_animation_data(obj):
+                fcurves = obj.animation_data.action.fcurves
+                keyed_bones = self.get_keyed_bones(arm, fcurves)
+            bones = self.clean_bone_list(arm, bone_parents, keyed_bones)
+        self._count('bones_in', len(arm.bones))
+        self._count('bones_out', len(bones))
+        self._count_keyframes_in(bones, fcurves)
+        
+        with self._stage('select_frames'):
+            frames, is_keyframe_clean = self.select_frames(bones, fcurves)
+        
+        fps = context.scene.render.fps
+        time_step = 1 / fps * (1.0 / self.time_scale)
+        
+        with self._stage('track_cache_lookup'):
+            settings = self.get_track_cache_settings(context, frames, is_keyframe_clean)
+            keys = TrackCache.get_keys(obj, bones, bone_parents, settings)
+            cached = {}
+            for bone in bones:
+                channels = TrackCache.get(keys[bone.name])
+                if channels is not None:
+                    cached[bone.name] = dict(channels)
+        missing = [bone for bone in bones if bone.name not in cached]
+        self._count('tracks_reused', len(cached))
+        
+        if missing:
+            with self._stage('sample'), self.evaluation_scope(context, obj):
+                tracks = self.sample_tracks(context, obj.pose, missing, bone_parents, frames, is_keyframe_clean)
+            
+            with self._stage('get_track_data'):
+                for bone in missing:
+                    cached[bone.name] = tracks.get(bone.name, {})
+            
+            if self.is_optimizing_channel_keys:
+                with self._stage('optimize_channel_keys'):
+                    kept, total = self.optimize_channel_keys([cached[bone.name] for bone in missing], fps)
+                self.report_channel_reduction(kept, total)
+            
+            for bone in missing:
+                TrackCache.put(keys[bone.name], cached[bone.name], self.track_cache_bytes)
         
-        anm = self.assemble_anm(
-            bone_parents, bones, track_data, time_step,
-            auto_smooth=(self.is_smooth_handle and (self.export_method == 'ALL' or self.export_method == 'DIRECT_OPTIMIZED'))
+        self.reporter.report(type={'INFO'}, message=f"Reused {len(bones) - len(missing)} of {len(bones)} bone tracks from earlier exports")
+        track_data = {bone.name: cached[bone.name] for bone in bones}
+        return bone_parents, bones, track_data, time_step
+    
+    def get_track_cache_settings(self, context, frames, is_keyframe_clean: bool) -> tuple:
+        """Builder settings and sampled frames that every cached track depends on"""
+        return (
+            self.export_method, self.scale, self.frame_start, self.time_scale, context.scene.render.fps,
+            is_keyframe_clean, self.is_location, self.is_rotation, self.is_scale,
+            self.is_optimizing_channel_keys, self.optimization_mode, self.is_per_channel_keys,
+            self.channel_tolerance, self.hermite_tolerance,
+            np.asarray(frames, dtype=np.float64).tobytes(),
         )
-
-        return anm
+    
+    @property
+    def is_auto_smooth(self) -> bool:
+        if self.export_method == 'DIRECT_OPTIMIZED' and self.optimization_mode == 'HERMITE':
+            return False # Tangents come from the fit
+        return self.is_smooth_handle and (self.export_method == 'ALL' or self.export_method == 'DIRECT_OPTIMIZED')
 
     def get_animation_frames(self, context, pose, bones, bone_parents):
         fps = context.scene.render.fps
         
-        anm_data_raw: dict[str, Track] = {}
-        
-        class Track(dict):
-            def __init__(self):
-                super().__init__()
-                self['LOC'] = {}
-                self['ROT'] = {}
-                self['SCL'] = {}
-            @property
-            def loc_dict(self) -> dict[float, Vector]:
-                return self['LOC']
-            @property
-            def rot_dict(self) -> dict[float, Quaternion]:
-                return self['ROT']
-            @property
-            def scl_dict(self) -> dict[float, Vector]:
-                return self['SCL']
+        frames = self.get_sample_frames()
+        key_frame_count = len(frames)
+        
+        if self.is_batched_sampling and PoseSampler.is_supported():
+            return self.sample_tracks(context, pose, bones, bone_parents, frames, self.is_keyframe_clean)
+        
+        recorders: dict[str, TrackRecorder] = {}
+        for key_frame_index, (frame, samples) in enumerate(self.sample_pose_frames(context, pose, bones, bone_parents, frames)):
+            time = (frame - self.frame_start) / fps * (1.0 / self.time_scale)
+            
+            for bone, loc, rot, scl in samples:
+                if bone.name not in recorders:
+                    recorders[bone.name] = TrackRecorder(self, key_frame_count, self.is_keyframe_clean)
+                recorders[bone.name].add(key_frame_index, time, loc, rot, scl)
+        
+
+        self.report_invalid_bones()
+
+        return {bone_name: recorder.track for bone_name, recorder in recorders.items()}
+    
+    def sample_tracks(self, context, pose, bones, bone_parents, frames, is_keyframe_clean: bool) -> dict[str, dict[Anm.ChannelIdType, ChannelKeys]]:
+        """Sample frames into the columnar channels of each bone, cleaning whole arrays instead of frame by frame"""
+        fps = context.scene.render.fps
+        times = np.array([(frame - self.frame_start) / fps * (1.0 / self.time_scale) for frame in frames], dtype=np.float64)
+        
+        locs, rots, scls, valid = self.sample_pose_arrays(context, pose, bones, bone_parents, frames)
+        self.report_invalid_bones()
         
+        masks = self.get_keep_masks(locs, rots, scls, valid, is_keyframe_clean)
+        return {
+            bone.name: self.get_channels_from_arrays(bone_index, times, (locs, rots, scls), masks)
+            for bone_index, bone in enumerate(bones) if valid[:, bone_index].any()
+        }
+    
+    def get_keep_masks(self, locs, rots, scls, valid, is_keyframe_clean: bool) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """[frame, bone] masks of the samples kept for the LOC, ROT and SCL channels"""
+        if not is_keyframe_clean:
+            return valid, valid, valid
+        return tuple(self.get_clean_keyframe_mask(values, valid) for values in (locs, rots, scls))
+    
+    def get_channels_from_arrays(self, bone_index: int, times: np.ndarray, samples, masks) -> dict[Anm.ChannelIdType, ChannelKeys]:
+        """Columnar channels of one bone, taken from the masked rows of [frame, bone] sample arrays"""
+        locs, rots, scls = samples
+        loc_keep, rot_keep, scl_keep = masks
+        channels = {}
+        for is_enabled, values, keep, channel_components in (
+            (self.is_location, locs, loc_keep, self.LOC_CHANNELS),
+            (self.is_rotation, rots, rot_keep, self.ROT_CHANNELS),
+            (self.is_scale   , scls, scl_keep, self.SCL_CHANNELS),
+        ):
+            if not is_enabled:
+                continue
+            frame_indices = np.flatnonzero(keep[:, bone_index])
+            if not len(frame_indices):
+                continue
+            channel_times = times[frame_indices]
+            # Rounded like the mathutils values of the per-key path
+            channel_values = values[frame_indices, bone_index].astype(np.float32)
+            for channel_id, component in channel_components:
+                channels[channel_id] = ChannelKeys(channel_times, channel_values[:, component])
+        return channels
+    
+    @staticmethod
+    def get_clean_keyframe_mask(values: np.ndarray, valid: np.ndarray, tolerance: float = 1e-6) -> np.ndarray:
+        """Array version of the determine_new_keyframe() cleaning, for all bones at once.
+        
+        values is [frame, bone, component] and valid is [frame, bone]. Runs of samples with
+        a constant difference (slope) collapse to their end points: a sample is kept where
+        the difference to the previous sample deviates from the slope of the run by
+        tolerance or more, together with the sample before it. The first and last samples
+        are always kept. Differences are taken in float32, like the mathutils values.
+        """
+        frame_count, bone_count = valid.shape
+        values = values.astype(np.float32)
+        tolerance = np.float32(tolerance)
+        keep = np.zeros((frame_count, bone_count), dtype=bool)
+        
+        prev_values = np.zeros(values.shape[1:], dtype=np.float32)
+        slopes = np.zeros(values.shape[1:], dtype=np.float32)
+        prev_indices = np.zeros(bone_count, dtype=np.intp)
+        is_started = np.zeros(bone_count, dtype=bool)
+        for frame_index in range(frame_count):
+            is_valid = valid[frame_index]
+            is_first = is_valid & ~is_started
+            is_forced = is_valid if frame_index == frame_count - 1 else is_first
+            
+            current = values[frame_index]
+            diffs = prev_values - current
+            is_mismatch = is_valid & ~is_forced & (np.abs(diffs - slopes) >= tolerance).any(axis=1)
+            
+            keep[frame_index] = is_forced | is_mismatch
+            keep[prev_indices[is_mismatch], is_mismatch.nonzero()[0]] = True
+            slopes[is_mismatch] = diffs[is_mismatch]
+            slopes[is_first] = 0
+            
+            prev_values[is_valid] = current[is_valid]
+            prev_indices[is_valid] = frame_index
+            is_started |= is_valid
+        return keep
+    
+    def get_sample_frames(self) -> list[float]:
+        """Frames sampled by the ALL method"""
         key_frame_count = self.key_frame_count
         if key_frame_count == -1:
             key_frame_count = (self.frame_end - self.frame_start) + 1
-            
-        same_locs: dict[str, Vector    ] = {}
-        same_rots: dict[str, Quaternion] = {}
-        same_scls: dict[str, Vector    ] = {}
-        pre_rots = {}
+        
+        frames = []
         for key_frame_index in range(key_frame_count):
             if key_frame_count == 1:
                 frame = self.frame_start
             else:
                 frame = (self.frame_end - self.frame_start) / (key_frame_count - 1) * key_frame_index + self.frame_start
-            if not self.no_set_frame:
-                context.scene.frame_set(frame=int(frame), subframe=frame - int(frame))
-                if compat.IS_LEGACY:
-                    context.scene.update()
-                else:
-                    layer = context.view_layer
-                    layer.update()
-
-            time = (frame - self.frame_start) / fps * (1.0 / self.time_scale)
-            
-            for bone in bones:
-                if bone.name not in anm_data_raw:
-                    anm_data_raw[bone.name] = Track()
-                    same_locs[bone.name] = []
-                    same_rots[bone.name] = []
-                    same_scls[bone.name] = []
-
-                pose_bone = pose.bones[bone.name]
-                pose_mat: Matrix = pose_bone.matrix.copy() #ob.convert_space(pose_bone=pose_bone, matrix=pose_bone.matrix, from_space='POSE', to_space='WORLD')
-                parent = bone_parents[bone.name]
-                if parent:
-                    pose_mat = compat.convert_bl_to_cm_bone_rotation(pose_mat)
-                    parent_space = self.try_get_bone_inverse(pose.bones[parent.name], frame)
-                    if parent_space is None:
-                        continue
-                    pose_mat = compat.mul(parent_space, pose_mat)
-                    pose_mat = compat.convert_bl_to_cm_bone_space(pose_mat)
-                else:
-                    pose_mat = compat.convert_bl_to_cm_bone_rotation(pose_mat)
-                    pose_mat = compat.convert_bl_to_cm_space(pose_mat)
-                
-                loc = pose_mat.to_translation() * self.scale
-                rot = pose_mat.to_quaternion()
-                scl = pose_mat.to_scale()
-
-                # This fixes rotations that jump to alternate representations.
-                if bone.name in pre_rots:
-                    if 5.0 < pre_rots[bone.name].rotation_difference(rot).angle:
-                        rot.w, rot.x, rot.y, rot.z = -rot.w, -rot.x, -rot.y, -rot.z
-                pre_rots[bone.name] = rot.copy()
-                
-                if (not self.is_keyframe_clean 
-                    or key_frame_index == 0 
-                    or key_frame_index == key_frame_count - 1
-                    or len(anm_data_raw[bone.name].loc_dict) == 0):
-                    
-                    anm_data_raw[bone.name].loc_dict[time] = loc.copy()
-                    anm_data_raw[bone.name].rot_dict[time] = rot.copy()
-                    anm_data_raw[bone.name].scl_dict[time] = scl.copy()
-
-                    if self.is_keyframe_clean:
-                        same_locs[bone.name].append(KeyFrame(time, loc.copy()))
-                        same_rots[bone.name].append(KeyFrame(time, rot.copy()))
-                        same_scls[bone.name].append(KeyFrame(time, scl.copy()))
-                else:
-                    
-                    new_same_list, new_keydict = self.determine_new_keyframe(time, same_locs[bone.name].copy(), loc)
-                    same_locs[bone.name] = new_same_list
-                    anm_data_raw[bone.name].loc_dict.update(new_keydict)
-                    
-                    #a = same_rots[bone.name][-1].value - rot
-                    #b = same_rots[bone.name][-1].slope
-                    #if self.check_is_mismatch(a.w, b.w) or self.check_is_mismatch(a.x, b.x) or self.check_is_mismatch(a.y, b.y) or self.check_is_mismatch(a.z, b.z):
-                    #    if 2 <= len(same_rots[bone.name]):
-                    #        anm_data_raw[bone.name].rot_dict[same_rots[bone.name][-1].time] = same_rots[bone.name][-1].value.copy()
-                    #    anm_data_raw[bone.name].rot_dict[time] = rot.copy()
-                    #    same_rots[bone.name] = [KeyFrame(time, rot.copy(), a.copy())] # update last position and slope
-                    #else:
-                    #    same_rots[bone.name].append(KeyFrame(time, rot.copy(), b.copy())) # update last position, but not last slope
-
-                    new_same_list, new_keydict = self.determine_new_keyframe(time, same_rots[bone.name].copy(), rot)
-                    same_rots[bone.name] = new_same_list
-                    anm_data_raw[bone.name].rot_dict.update(new_keydict)
-                    
-                    new_same_list, new_keydict = self.determine_new_keyframe(time, same_scls[bone.name].copy(), scl)
-                    same_scls[bone.name] = new_same_list
-                    anm_data_raw[bone.name].scl_dict.update(new_keydict)
-        
-
-        self.report_invalid_bones()
-
-        return anm_data_raw
+            frames.append(frame)
+        return frames
     
     def get_direct_keyframes_optimized(self, context, pose, bones, bone_parents, fcurves):
         """Optimized keyframe collection using ALL method's stable logic
         but only sampling at actual keyframe times for smaller file sizes"""
         fps = context.scene.render.fps
         
-        anm_data_raw: dict[str, Track] = {}
-        
-        class Track(dict):
-            def __init__(self):
-                super().__init__()
-                self['LOC'] = {}
-                self['ROT'] = {}
-                self['SCL'] = {}
-            @property
-            def loc_dict(self) -> dict[float, Vector]:
-                return self['LOC']
-            @property
-            def rot_dict(self) -> dict[float, Quaternion]:
-                return self['ROT']
-            @property
-            def scl_dict(self) -> dict[float, Vector]:
-                return self['SCL']
+        keyframe_times = self.get_direct_keyframe_times(bones, fcurves)
+        
+        if self.is_batched_sampling and PoseSampler.is_supported():
+            return self.sample_tracks(context, pose, bones, bone_parents, keyframe_times, is_keyframe_clean=False)
+        
+        # Use ALL method's proven pose matrix logic for each keyframe time
+        recorders: dict[str, TrackRecorder] = {}
+        for key_frame_index, (frame, samples) in enumerate(self.sample_pose_frames(context, pose, bones, bone_parents, keyframe_times)):
+            time = (frame - self.frame_start) / fps * (1.0 / self.time_scale)
+            
+            for bone, loc, rot, scl in samples:
+                if bone.name not in recorders:
+                    # Store keyframe data WITHOUT tangents (like ALL method)
+                    recorders[bone.name] = TrackRecorder(self, len(keyframe_times), is_keyframe_clean=False)
+                recorders[bone.name].add(key_frame_index, time, loc, rot, scl)
+
+        self.report_invalid_bones()
+        return {bone_name: recorder.track for bone_name, recorder in recorders.items()}
+    
+    @property
+    def is_optimizing_channel_keys(self) -> bool:
+        """Whether the keys of each channel are chosen again after sampling (per-channel keys or Hermite fitting)"""
+        return self.export_method == 'DIRECT_OPTIMIZED' and (self.is_per_channel_keys or self.optimization_mode == 'HERMITE')
+    
+    def optimize_channel_keys(self, bone_tracks, fps) -> tuple[int, int]:
+        if self.optimization_mode == 'HERMITE':
+            return self.fit_hermite_channels(bone_tracks, fps)
+        return self.reduce_channel_keys(bone_tracks, fps)
+    
+    def reduce_channel_keys(self, bone_tracks, fps) -> tuple[int, int]:
+        """Drop the keyframes of each channel that its neighbours already describe.
+        
+        The key times picked by get_direct_keyframe_times() are shared by every bone.
+        Here every channel of every bone is simplified on its own CM3D2-space values
+        (RDP with frames on the time axis and channel_tolerance), all in one batch.
+        Channels are modified in place, returns (kept, total) keyframe counts.
+        """
+        frames_per_second = fps * self.time_scale
+        curves = []
+        channel_refs = []
+        total = 0
+        for channels in bone_tracks:
+            for channel_id, keys in channels.items():
+                total += len(keys)
+                if len(keys) <= 2:
+                    continue
+                curves.append(np.column_stack((keys.times * frames_per_second, keys.values.astype(np.float64))))
+                channel_refs.append((channels, channel_id))
+        
+        kept = total
+        if curves:
+            keep = self._rdp_simplify_batched(curves, self.channel_tolerance)
+            offset = 0
+            for (channels, channel_id), curve in zip(channel_refs, curves):
+                channels[channel_id] = channels[channel_id].select(keep[offset:offset + len(curve)])
+                kept -= len(curve) - len(channels[channel_id])
+                offset += len(curve)
+        return kept, total
+    
+    def fit_hermite_channels(self, bone_tracks, fps) -> tuple[int, int]:
+        """Replace densely sampled channels with Hermite keyframes that stay within hermite_tolerance.
+        
+        A segment between two keys is a cubic Hermite curve defined by the outTangent of
+        its first key and the inTangent of its last key, which is how the game
+        interpolates. Both tangents are solved by least squares against the samples
+        inside the segment; a segment that still deviates more than the tolerance is
+        split at its worst sample. Since every segment owns its two tangents, segments
+        are fitted independently. Channels are modified in place, returns (kept, total)
+        keyframe counts.
+        """
+        kept = total = 0
+        for channels in bone_tracks:
+            for channel_id, keys in channels.items():
+                total += len(keys)
+                if len(keys) <= 1:
+                    kept += len(keys)
+                    continue
+                fitted = self.fit_hermite_curve(keys.times, keys.values.astype(np.float64), self.hermite_tolerance)
+                channels[channel_id] = fitted
+                kept += len(fitted)
+        return kept, total
+    
+    @staticmethod
+    def fit_hermite_curve(times: np.ndarray, values: np.ndarray, tolerance: float) -> ChannelKeys:
+        """Fit keys with in and out tangents through a subset of the samples"""
+        count = len(times)
+        in_tangents = np.zeros(count)
+        out_tangents = np.zeros(count)
+        is_key = np.zeros(count, dtype=bool)
+        is_key[[0, -1]] = True
+        
+        segments = [(0, count - 1)]
+        while segments:
+            start, end = segments.pop()
+            dt = times[end] - times[start]
+            slope = (values[end] - values[start]) / dt
+            if end - start < 2:
+                out_tangents[start] = in_tangents[end] = slope
+                continue
+            
+            s = (times[start + 1:end] - times[start]) / dt
+            s2 = s * s
+            s3 = s2 * s
+            h00 = 2 * s3 - 3 * s2 + 1
+            h10 = s3 - 2 * s2 + s
+            h01 = -2 * s3 + 3 * s2
+            h11 = s3 - s2
+            
+            # Solve for the deviation from the straight line, so few samples still give sane tangents
+            basis = np.stack((h10 * dt, h11 * dt), axis=1)
+            linear = h00 * values[start] + h01 * values[end] + (h10 + h11) * dt * slope
+            delta = np.linalg.lstsq(basis, values[start + 1:end] - linear, rcond=None)[0]
+            tangent_out, tangent_in = slope + delta
+            
+            errors = np.abs(linear + basis @ delta - values[start + 1:end])
+            worst = int(np.argmax(errors))
+            if errors[worst] > tolerance:
+                split = start + 1 + worst
+                is_key[split] = True
+                segments.append((split, end))
+                segments.append((start, split))
+            else:
+                out_tangents[start] = tangent_out
+                in_tangents[end] = tangent_in
         
+        return ChannelKeys(times[is_key], values[is_key], in_tangents[is_key], out_tangents[is_key])
+    
+    def report_channel_reduction(self, kept: int, total: int):
+        if total:
+            self.reporter.report(type={'INFO'}, message=f"Channel keys: kept {kept} of {total} keyframes ({(1 - kept / total) * 100:.1f}% reduction)")
+    
+    def get_direct_keyframe_times(self, bones, fcurves) -> list[float]:
         # Multi-mode keyframe optimization
         if self.optimization_mode == 'SIMPLE':
             keyframe_times = self._get_simple_keyframes()
         elif self.optimization_mode == 'DENSITY':
-            keyframe_times = self._get_density_keyframes_cached(bones, fcurves)
+            keyframe_times = self._get_density_keyframes(bones, fcurves)
         elif self.optimization_mode == 'MOTION':
-            keyframe_times = self._get_motion_keyframes_cached(bones, fcurves)
+            keyframe_times = self._get_motion_keyframes(bones, fcurves)
         elif self.optimization_mode == 'RDP':
-            keyframe_times = self._get_rdp_keyframes_cached(bones, fcurves)
+            keyframe_times = self._get_rdp_keyframes(bones, fcurves)
+        elif self.optimization_mode == 'HERMITE':
+            keyframe_times = list(range(self.frame_start, self.frame_end + 1))  # Keys are chosen by fit_hermite_channels()
         else:
-            keyframe_times = self._get_density_keyframes_cached(bones, fcurves)  # Default fallback
+            keyframe_times = self._get_density_keyframes(bones, fcurves)  # Default fallback
         
         # Debug info
         reduction_ratio = (1 - len(keyframe_times) / (self.frame_end - self.frame_start + 1)) * 100
         self.reporter.report(type={'INFO'}, message=f"Direct Optimized: {len(keyframe_times)} keyframes (vs {self.frame_end - self.frame_start + 1} total) - {reduction_ratio:.1f}% reduction")
+        return keyframe_times
+    
+    def _stage(self, name: str):
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(name)
+    
+    def _count(self, name: str, amount: int = 1):
+        if self.profiler is not None:
+            self.profiler.count(name, amount)
+    
+    def _count_keyframes_in(self, bones, fcurves):
+        if self.profiler is not None:
+            self.profiler.count('keyframes_in', self.count_source_keyframes(bones, fcurves))
+    
+    @staticmethod
+    def count_source_keyframes(bones, fcurves) -> int:
+        """Keyframes on the transform FCurves of the bones, what an export starts from"""
+        if not fcurves:
+            return 0
+        fcurve_index = FCurveIndex.get(fcurves)
+        return sum(
+            len(fcurve.keyframe_points)
+            for bone in bones
+            for prop in ('location', 'rotation_quaternion', 'rotation_euler', 'scale')
+            for fcurve in fcurve_index.get_prop(bone.name, prop) if fcurve
+        )
+    
+    def set_frame(self, context, frame: float):
+        if self.no_set_frame:
+            return
+        self._count('frame_set')
+        context.scene.frame_set(frame=int(frame), subframe=frame - int(frame))
+        if compat.IS_LEGACY:
+            context.scene.update()
+        else:
+            layer = context.view_layer
+            layer.update()
+    
+    def evaluation_scope(self, context, obj: bpy.types.Object):
+        if self.is_isolated_evaluation and not self.no_set_frame:
+            return self.isolated_evaluation(context, obj)
+        return contextlib.nullcontext()
+    
+    @contextlib.contextmanager
+    def isolated_evaluation(self, context, obj: bpy.types.Object):
+        """Only evaluate obj and the objects it depends on while changing frames.
         
-        # Use ALL method's proven pose matrix logic for each keyframe time
+        Every other object in the view layer is disabled in viewports for the duration,
+        so frame_set does not evaluate unrelated meshes, modifiers or simulations.
+        The visibility flags and the current frame are restored afterwards.
+        """
+        scene = context.scene
+        frame_current, frame_subframe = scene.frame_current, scene.frame_subframe
+        
+        dependencies = self.get_evaluation_dependencies(obj)
+        muted_objects = []
+        try:
+            for ob in context.view_layer.objects:
+                if ob in dependencies or ob.hide_viewport or ob.library:
+                    continue
+                ob.hide_viewport = True
+                muted_objects.append(ob)
+            yield
+        finally:
+            for ob in muted_objects:
+                ob.hide_viewport = False
+            scene.frame_set(frame=frame_current, subframe=frame_subframe)
+            if compat.IS_LEGACY:
+                scene.update()
+            else:
+                context.view_layer.update()
+    
+    @staticmethod
+    def get_evaluation_dependencies(obj: bpy.types.Object) -> set[bpy.types.Object]:
+        """Objects that can influence the evaluated pose of obj"""
+        def pointed_objects(struct):
+            for prop in struct.bl_rna.properties:
+                if prop.type == 'POINTER' and prop.fixed_type and prop.fixed_type.identifier == 'Object':
+                    target = getattr(struct, prop.identifier, None)
+                    if target:
+                        yield target
+        
+        def direct_dependencies(ob: bpy.types.Object):
+            if ob.parent:
+                yield ob.parent
+            constraints = list(ob.constraints)
+            if ob.pose:
+                for pose_bone in ob.pose.bones:
+                    constraints.extend(pose_bone.constraints)
+            for constraint in constraints:
+                yield from pointed_objects(constraint)
+                for target in getattr(constraint, 'targets', ()):  # Armature constraint
+                    if target.target:
+                        yield target.target
+            for modifier in ob.modifiers:
+                yield from pointed_objects(modifier)
+            for anim_data in (ob.animation_data, getattr(ob.data, 'animation_data', None)):
+                if not anim_data:
+                    continue
+                for driver in anim_data.drivers:
+                    for variable in driver.driver.variables:
+                        for target in variable.targets:
+                            if isinstance(target.id, bpy.types.Object):
+                                yield target.id
+        
+        dependencies = {obj}
+        queue = [obj]
+        while queue:
+            for dependency in direct_dependencies(queue.pop()):
+                if dependency not in dependencies:
+                    dependencies.add(dependency)
+                    queue.append(dependency)
+        return dependencies
+    
+    def sample_pose_frames(self, context, pose, bones, bone_parents, frames):
+        """Yield (frame, [(bone, loc, rot, scl), ...]) in CM3D2 space for each frame.
+        
+        Bones whose parent has no valid inverse on a frame are left out of that frame.
+        """
         pre_rots = {}
-        for frame in keyframe_times:
-            if not self.no_set_frame:
-                context.scene.frame_set(frame=int(frame), subframe=frame - int(frame))
-                if compat.IS_LEGACY:
-                    context.scene.update()
-                else:
-                    layer = context.view_layer
-                    layer.update()
-
-            time = (frame - self.frame_start) / fps * (1.0 / self.time_scale)
+        for frame in frames:
+            self.set_frame(context, frame)
+            self._count('bone_samples', len(bones))
             
+            samples = []
             for bone in bones:
-                if bone.name not in anm_data_raw:
-                    anm_data_raw[bone.name] = Track()
-
                 pose_bone = pose.bones[bone.name]
-                pose_mat: Matrix = pose_bone.matrix.copy()
+                pose_mat: Matrix = pose_bone.matrix.copy() #ob.convert_space(pose_bone=pose_bone, matrix=pose_bone.matrix, from_space='POSE', to_space='WORLD')
                 parent = bone_parents[bone.name]
                 if parent:
                     pose_mat = compat.convert_bl_to_cm_bone_rotation(pose_mat)
@@ -653,257 +1350,266 @@ class AnmBuilder:
                 rot = pose_mat.to_quaternion()
                 scl = pose_mat.to_scale()
 
-                # Apply rotation jump fix from ALL method (same threshold as original)
+                # This fixes rotations that jump to alternate representations.
                 if bone.name in pre_rots:
                     if 5.0 < pre_rots[bone.name].rotation_difference(rot).angle:
                         rot.w, rot.x, rot.y, rot.z = -rot.w, -rot.x, -rot.y, -rot.z
                 pre_rots[bone.name] = rot.copy()
                 
-                # Store keyframe data WITHOUT tangents (like ALL method)
-                anm_data_raw[bone.name].loc_dict[time] = loc.copy()
-                anm_data_raw[bone.name].rot_dict[time] = rot.copy()
-                anm_data_raw[bone.name].scl_dict[time] = scl.copy()
-
-        self.report_invalid_bones()
-        return anm_data_raw
+                samples.append((bone, loc, rot, scl))
+            yield frame, samples
     
-    def _get_simple_keyframes(self):
-        """Simple uniform sampling - every Nth frame"""
-        keyframes = []
-        for frame in range(self.frame_start, self.frame_end + 1, self.simple_step):
-            keyframes.append(frame)
+    def sample_matrices_in_workers(self, context, sampler: PoseSampler, frames) -> np.ndarray:
+        """Sample pose matrices with background Blender processes, one contiguous chunk of frames each.
         
-        # Always include start and end
-        keyframes.extend([self.frame_start, self.frame_end])
-        return sorted(set(keyframes))
+        Chunks are merged in frame order before any conversion, so the result, including
+        quaternion sign continuity across chunk boundaries, is the same as sampling serially.
+        """
+        obj = sampler.pose.id_data
+        chunks = [chunk for chunk in np.array_split(np.arange(len(frames)), self.sampling_workers) if len(chunk)]
+        with tempfile.TemporaryDirectory(prefix='anm_export_') as temp_dir:
+            blend_path = bpy.data.filepath
+            if not blend_path or bpy.data.is_dirty:
+                blend_path = os.path.join(temp_dir, 'sample_source.blend')
+                bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+            
+            args = [bpy.app.binary_path, '--background', '--factory-startup']
+            if context.preferences.filepaths.use_scripts_auto_execute:
+                args.append('--enable-autoexec')
+            
+            workers = []
+            for chunk_index, chunk in enumerate(chunks):
+                job_path = os.path.join(temp_dir, f'job_{chunk_index}.json')
+                output_path = os.path.join(temp_dir, f'chunk_{chunk_index}.npy')
+                log_path = os.path.join(temp_dir, f'chunk_{chunk_index}.log')
+                with open(job_path, 'w', encoding='utf-8') as job_file:
+                    json.dump({
+                        'scene'     : context.scene.name,
+                        'view_layer': context.view_layer.name,
+                        'object'    : obj.name,
+                        'bones'     : sampler.names,
+                        'frames'    : [float(frames[i]) for i in chunk],
+                        'output'    : output_path,
+                    }, job_file)
+                log_file = open(log_path, 'wb')
+                process = subprocess.Popen(
+                    args + [blend_path, '--python-expr', _SAMPLE_WORKER_SOURCE, '--', job_path],
+                    stdout=log_file, stderr=subprocess.STDOUT
+                )
+                workers.append((process, log_file, log_path, output_path))
+            
+            results = []
+            try:
+                for process, log_file, log_path, output_path in workers:
+                    returncode = process.wait()
+                    log_file.close()
+                    if returncode != 0 or not os.path.exists(output_path):
+                        with open(log_path, 'rb') as log:
+                            tail = log.read()[-2000:].decode('utf-8', errors='replace')
+                        raise common.CM3D2ExportError(f"Background sampling worker failed (exit code {returncode}):\n{tail}")
+                    results.append(np.load(output_path))
+            finally:
+                for process, log_file, log_path, output_path in workers:
+                    if process.poll() is None:
+                        process.kill()
+                        process.wait()
+                    log_file.close()
+        
+        return np.concatenate(results, axis=0)
     
-    def _cache_fcurves_for_bones(self, bones, fcurves):
-        """Cache FCurve lookups to avoid repeated finds - performance optimization"""
-        fcurve_cache = {}
-        prop_sizes = {'location': 3, 'rotation_quaternion': 4, 'rotation_euler': 3, 'scale': 3}
+    def sample_pose_arrays(self, context, pose, bones, bone_parents, frames):
+        """Sample frames with PoseSampler, returns (locs, rots, scls, valid) arrays indexed [frame, bone]"""
+        samples = None
+        if self.is_sample_cache and not self.no_set_frame:
+            samples = self.get_cached_samples(context, pose, bones, bone_parents, frames)
+        if samples is None:
+            samples = self._sample_pose_arrays_unfixed(context, pose, bones, bone_parents, frames)
+        
+        locs, rots, scls, valid = samples
+        PoseSampler.fix_rotation_flips(rots, valid)
+        return locs, rots, scls, valid
+    
+    def get_cached_samples(self, context, pose, bones, bone_parents, frames):
+        """Unfixed (locs, rots, scls, valid) of frames taken from the SampleCache file of the action.
+        
+        On a miss every frame of the range is sampled for every bone and stored first,
+        so later exports can pick any other frames and bones from the same file.
+        Returns None when the frames or the scene can not be served from the cache.
+        """
+        frame_indices = SampleCache.get_frame_indices(frames, self.frame_start, self.frame_end)
+        if frame_indices is None:
+            return None
+        obj = pose.id_data
+        with self._stage('sample_cache_lookup'):
+            cache = SampleCache.get(obj, bone_parents, self.frame_start, self.frame_end, self.scale, self.bone_parent_from)
+            data = cache.load() if cache else None
+        if cache is None:
+            return None
+        
+        if data is None:
+            all_bones = list(obj.data.bones)
+            all_frames = list(range(self.frame_start, self.frame_end + 1))
+            data = cache.save(*self._sample_pose_arrays_unfixed(context, pose, all_bones, bone_parents, all_frames))
+        else:
+            self._count('sample_cache_hits')
+        
+        columns = np.array([cache.bone_indices[bone.name] for bone in bones], dtype=np.intp)
+        # Fancy indexing copies just the requested rows out of the memory map
+        samples = data[frame_indices[:, None], columns[None, :]]
+        return (
+            samples[..., 0:3].copy(), samples[..., 3:7].copy(), samples[..., 7:10].copy(),
+            samples[..., 10] != 0,
+        )
+    
+    def _sample_pose_arrays_unfixed(self, context, pose, bones, bone_parents, frames):
+        sampler = PoseSampler(pose, bones, bone_parents)
+        samples = sampler.allocate_samples(len(frames))
+        for start, matrices in self._sample_matrix_blocks(context, sampler, frames):
+            sampler.convert_into(matrices, self.scale, samples, start)
+            for frame_index, parent_index in zip(*np.nonzero(sampler.singular_parents)):
+                parent_name = sampler.names[sampler.parent_indices[parent_index]]
+                self._invalid_bones.setdefault(parent_name, []).append(
+                    (frames[start + frame_index], Matrix(matrices[frame_index, sampler.parent_indices[parent_index]].tolist()))
+                )
+        self._count('bone_samples', samples[3].size)
+        return samples
+    
+    def _sample_matrix_blocks(self, context, sampler: PoseSampler, frames):
+        """Yield (first frame index, pose matrices) blocks of at most PoseSampler.CONVERT_BLOCK_FRAMES frames"""
+        block_frames = PoseSampler.CONVERT_BLOCK_FRAMES
+        if self.sampling_workers > 1 and len(frames) > 1 and not self.no_set_frame:
+            matrices = self.sample_matrices_in_workers(context, sampler, frames)
+            self._count('frame_set', len(frames))
+            for start in range(0, len(frames), block_frames):
+                yield start, matrices[start:start + block_frames]
+            return
+        
+        # One block buffer is reused, the matrices of the whole range never exist at once
+        buffer = sampler.allocate(min(len(frames), block_frames))
+        for start in range(0, len(frames), block_frames):
+            block = buffer[:len(frames[start:start + block_frames])]
+            for frame_index, frame in enumerate(frames[start:start + block_frames]):
+                self.set_frame(context, frame)
+                sampler.read(block[frame_index])
+            yield start, block
+    
+    def _get_simple_keyframes(self):
+        """Simple uniform sampling - every Nth frame"""
+        keyframes = np.arange(self.frame_start, self.frame_end + 1, self.simple_step)
         
+        # Always include start and end
+        return np.union1d(keyframes, [self.frame_start, self.frame_end]).tolist()
+    
+    def _cache_fcurves_for_bones(self, bones, fcurves):
+        """Cache FCurve lookups to avoid repeated finds - performance optimization"""
+        fcurve_index = FCurveIndex.get(fcurves)
+        fcurve_cache = {}
         for bone in bones:
-            rna_data_stub = f'pose.bones["{bone.name}"]'
             fcurve_cache[bone.name] = {}
-            
             for prop in ['location', 'rotation_quaternion', 'rotation_euler', 'scale']:
-                fcurve_cache[bone.name][prop] = []
-                for axis_index in range(prop_sizes[prop]):
-                    fcurve = fcurves.find(rna_data_stub + '.' + prop, index=axis_index)
-                    fcurve_cache[bone.name][prop].append(fcurve)
+                fcurve_cache[bone.name][prop] = fcurve_index.get_prop(bone.name, prop)
         
         return fcurve_cache
     
-    def _get_density_keyframes_cached(self, bones, fcurves):
-        """Smart density-based sampling with cached FCurve lookups"""
-        fcurve_cache = self._cache_fcurves_for_bones(bones, fcurves)
+    def _get_density_keyframes(self, bones, fcurves):
+        """Smart density-based sampling"""
+        all_keyframes = {self.frame_start, self.frame_end}  # Always include start and end
         
-        all_keyframes = set()
-        all_keyframes.add(self.frame_start)  # Always include start
-        all_keyframes.add(self.frame_end)    # Always include end
+        _, bone_ids, points = self._get_channel_fcurve_points(bones, fcurves)
+        if not len(points):
+            return sorted(all_keyframes)
         
-        for bone in bones:
-            bone_keyframes = set()
-            
-            for prop in ['location', 'rotation_quaternion', 'rotation_euler', 'scale']:
-                for fcurve in fcurve_cache[bone.name][prop]:
-                    if fcurve:
-                        for keyframe in fcurve.keyframe_points:
-                            bone_keyframes.add(int(keyframe.co[0]))
-            
-            # Check density: if bone has many keyframes (dense), thin it out
-            if bone_keyframes:
-                total_frames = self.frame_end - self.frame_start + 1
-                density_ratio = len(bone_keyframes) / total_frames
-                
-                if density_ratio > self.density_threshold:  # Dense keyframes
-                    # Keep every Nth keyframe for dense animation
-                    sorted_keyframes = sorted(bone_keyframes)
-                    thinned = sorted_keyframes[::self.dense_reduction]  # Every Nth frame
-                    all_keyframes.update(thinned)
-                else:  # Sparse keyframes
-                    # Keep all keyframes for sparse animation (position bones, etc.)
-                    all_keyframes.update(bone_keyframes)
+        # Unique whole keyframe numbers per bone, ordered by bone and frame
+        keys = np.unique(np.stack((bone_ids, np.trunc(points[:, 0]).astype(np.int64)), axis=1), axis=0)
+        bone_ids, frames = keys[:, 0], keys[:, 1]
+        counts = np.bincount(bone_ids, minlength=len(bones))
+        rank = np.arange(len(frames)) - (np.cumsum(counts) - counts)[bone_ids]
+        
+        # Dense bones keep every Nth keyframe, sparse bones (position bones, etc.) keep all
+        total_frames = self.frame_end - self.frame_start + 1
+        is_dense = counts / total_frames > self.density_threshold
+        keep = ~is_dense[bone_ids] | (rank % self.dense_reduction == 0)
+        all_keyframes.update(np.unique(frames[keep]).tolist())
         
         return sorted(all_keyframes)
     
-    def _get_density_keyframes(self, bones, fcurves):
-        """Smart density-based sampling"""
-        all_keyframes = set()
-        all_keyframes.add(self.frame_start)  # Always include start
-        all_keyframes.add(self.frame_end)    # Always include end
+    def _get_channel_fcurve_points(self, bones, fcurves) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(channel index, bone index, (frame, value)) arrays of all keyframe points of the bones.
         
-        for bone in bones:
-            rna_data_stub = f'pose.bones["{bone.name}"]'
-            bone_keyframes = set()
-            
+        Every FCurve is a channel, its points are sorted by frame.
+        """
+        fcurve_cache = self._cache_fcurves_for_bones(bones, fcurves)
+        channel_points = []
+        channel_bones = []
+        for bone_index, bone in enumerate(bones):
             for prop in ['location', 'rotation_quaternion', 'rotation_euler', 'scale']:
-                prop_sizes = {'location': 3, 'rotation_quaternion': 4, 'rotation_euler': 3, 'scale': 3}
-                for axis_index in range(prop_sizes[prop]):
-                    fcurve = fcurves.find(rna_data_stub + '.' + prop, index=axis_index)
-                    if fcurve:
-                        for keyframe in fcurve.keyframe_points:
-                            bone_keyframes.add(int(keyframe.co[0]))
-            
-            # Check density: if bone has many keyframes (dense), thin it out
-            if bone_keyframes:
-                total_frames = self.frame_end - self.frame_start + 1
-                density_ratio = len(bone_keyframes) / total_frames
-                
-                if density_ratio > self.density_threshold:  # Dense keyframes
-                    # Keep every Nth keyframe for dense animation
-                    sorted_keyframes = sorted(bone_keyframes)
-                    thinned = sorted_keyframes[::self.dense_reduction]  # Every Nth frame
-                    all_keyframes.update(thinned)
-                else:  # Sparse keyframes
-                    # Keep all keyframes for sparse animation (position bones, etc.)
-                    all_keyframes.update(bone_keyframes)
-        
-        return sorted(all_keyframes)
+                for fcurve in fcurve_cache[bone.name][prop]:
+                    if fcurve and len(fcurve.keyframe_points):
+                        channel_points.append(self._get_fcurve_points(fcurve))
+                        channel_bones.append(bone_index)
+        if not channel_points:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 2))
+        
+        lengths = [len(points) for points in channel_points]
+        channel_ids = np.repeat(np.arange(len(channel_points)), lengths)
+        bone_ids = np.repeat(np.array(channel_bones, dtype=np.int64), lengths)
+        return channel_ids, bone_ids, np.concatenate(channel_points)
     
-    def _get_motion_keyframes_cached(self, bones, fcurves):
-        """Advanced motion-based keyframe detection with cached FCurve lookups"""
-        fcurve_cache = self._cache_fcurves_for_bones(bones, fcurves)
+    def _get_motion_keyframes(self, bones, fcurves):
+        """Advanced motion-based keyframe detection"""
+        significant_keyframes = {self.frame_start, self.frame_end}  # Always include start and end
         
-        significant_keyframes = set()
-        significant_keyframes.add(self.frame_start)  # Always include start
-        significant_keyframes.add(self.frame_end)    # Always include end
+        channel_ids, bone_ids, points = self._get_channel_fcurve_points(bones, fcurves)
+        if not len(points):
+            return sorted(significant_keyframes)
         
-        for bone in bones:
-            bone_keyframes = []
-            
-            # Collect all keyframes for this bone using cached FCurves
-            for prop in ['location', 'rotation_quaternion', 'rotation_euler', 'scale']:
-                for axis_index, fcurve in enumerate(fcurve_cache[bone.name][prop]):
-                    if fcurve:
-                        for keyframe in fcurve.keyframe_points:
-                            bone_keyframes.append((keyframe.co[0], keyframe.co[1], prop, axis_index))
-            
-            # Sort by time and detect significant changes
-            bone_keyframes.sort(key=lambda x: x[0])
-            if bone_keyframes:
-                # Always include first keyframe
-                significant_keyframes.add(bone_keyframes[0][0])
-                
-                # Add keyframes with significant motion changes
-                for i in range(1, len(bone_keyframes)):
-                    prev_frame, prev_value, prev_prop, prev_axis = bone_keyframes[i-1]
-                    curr_frame, curr_value, curr_prop, curr_axis = bone_keyframes[i]
-                    
-                    # Only compare same property and axis
-                    if prev_prop == curr_prop and prev_axis == curr_axis:
-                        value_change = abs(curr_value - prev_value)
-                        time_gap = curr_frame - prev_frame
-                        
-                        # Consider significant if large value change or long time gap
-                        is_significant = (value_change > self.motion_threshold or time_gap > self.time_gap_limit)
-                        
-                        if is_significant:
-                            significant_keyframes.add(curr_frame)
+        # Keyframes of all FCurves of a bone in one list sorted by time, ties keep the FCurve order
+        order = np.lexsort((np.arange(len(points)), points[:, 0], bone_ids))
+        channel_ids, bone_ids, frames, values = channel_ids[order], bone_ids[order], points[order, 0], points[order, 1]
         
-        return sorted(significant_keyframes)
-    
-    def _get_rdp_keyframes_cached(self, bones, fcurves):
-        """Ramer-Douglas-Peucker curve simplification with cached FCurve lookups"""
-        fcurve_cache = self._cache_fcurves_for_bones(bones, fcurves)
+        # Always include the first keyframe of each bone
+        bone_starts = np.flatnonzero(np.diff(bone_ids, prepend=-1))
+        significant_keyframes.update(frames[bone_starts].tolist())
         
-        rdp_keyframes = set()
-        rdp_keyframes.add(self.frame_start)  # Always include start
-        rdp_keyframes.add(self.frame_end)    # Always include end
+        # Neighbours in that list are only compared when they are of the same property and axis
+        is_same_channel = channel_ids[1:] == channel_ids[:-1]
+        # Consider significant if large value change or long time gap
+        is_significant = (np.abs(np.diff(values)) > self.motion_threshold) | (np.diff(frames) > self.time_gap_limit)
+        significant_keyframes.update(frames[1:][is_same_channel & is_significant].tolist())
         
+        return sorted(significant_keyframes)
+    
+    def _get_rdp_keyframes(self, bones, fcurves):
+        """Ramer-Douglas-Peucker curve simplification - mathematical optimal"""
+        fcurve_index = FCurveIndex.get(fcurves)
+        curves = []
         for bone in bones:
-            # Process each animation channel separately using cached FCurves
+            # Process each animation channel separately
             for prop in ['location', 'rotation_quaternion', 'rotation_euler', 'scale']:
-                for axis_index, fcurve in enumerate(fcurve_cache[bone.name][prop]):
+                for fcurve in fcurve_index.get_prop(bone.name, prop):
                     if fcurve and len(fcurve.keyframe_points) > 2:
-                        # Extract keyframe data as (frame, value) points
-                        points = [(kf.co[0], kf.co[1]) for kf in fcurve.keyframe_points]
-                        points.sort(key=lambda x: x[0])  # Sort by frame
-                        
-                        # Apply RDP algorithm to this curve
-                        if len(points) > 2:
-                            simplified_points = self._rdp_simplify(points, self.rdp_tolerance)
-                            
-                            # Add frames to keyframe set, respecting min distance
-                            for frame, value in simplified_points:
-                                rdp_keyframes.add(int(frame))
-        
-        # Enforce minimum frame distance
-        if self.rdp_min_distance > 1:
-            rdp_keyframes = self._enforce_min_distance(sorted(rdp_keyframes), self.rdp_min_distance)
+                        curves.append(self._get_fcurve_points(fcurve))
         
-        return sorted(rdp_keyframes)
+        return self._get_rdp_keyframe_times(curves)
     
-    def _get_motion_keyframes(self, bones, fcurves):
-        """Advanced motion-based keyframe detection"""
-        significant_keyframes = set()
-        significant_keyframes.add(self.frame_start)  # Always include start
-        significant_keyframes.add(self.frame_end)    # Always include end
-        
-        for bone in bones:
-            rna_data_stub = f'pose.bones["{bone.name}"]'
-            bone_keyframes = []
-            
-            # Collect all keyframes for this bone
-            for prop in ['location', 'rotation_quaternion', 'rotation_euler', 'scale']:
-                prop_sizes = {'location': 3, 'rotation_quaternion': 4, 'rotation_euler': 3, 'scale': 3}
-                for axis_index in range(prop_sizes[prop]):
-                    fcurve = fcurves.find(rna_data_stub + '.' + prop, index=axis_index)
-                    if fcurve:
-                        for keyframe in fcurve.keyframe_points:
-                            bone_keyframes.append((keyframe.co[0], keyframe.co[1], prop, axis_index))
-            
-            # Sort by time and detect significant changes
-            bone_keyframes.sort(key=lambda x: x[0])
-            if bone_keyframes:
-                # Always include first keyframe
-                significant_keyframes.add(bone_keyframes[0][0])
-                
-                # Add keyframes with significant motion changes
-                for i in range(1, len(bone_keyframes)):
-                    prev_frame, prev_value, prev_prop, prev_axis = bone_keyframes[i-1]
-                    curr_frame, curr_value, curr_prop, curr_axis = bone_keyframes[i]
-                    
-                    # Only compare same property and axis
-                    if prev_prop == curr_prop and prev_axis == curr_axis:
-                        value_change = abs(curr_value - prev_value)
-                        time_gap = curr_frame - prev_frame
-                        
-                        # Consider significant if large value change or long time gap
-                        is_significant = (value_change > self.motion_threshold or time_gap > self.time_gap_limit)
-                        
-                        if is_significant:
-                            significant_keyframes.add(curr_frame)
-        
-        return sorted(significant_keyframes)
+    @staticmethod
+    def _get_fcurve_points(fcurve: bpy.types.FCurve) -> np.ndarray:
+        """Keyframe (frame, value) points of an FCurve as an (n, 2) array sorted by frame"""
+        co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+        fcurve.keyframe_points.foreach_get('co', co)
+        points = co.astype(np.float64).reshape(-1, 2)
+        return points[np.argsort(points[:, 0], kind='stable')]
     
-    def _get_rdp_keyframes(self, bones, fcurves):
-        """Ramer-Douglas-Peucker curve simplification - mathematical optimal"""
+    def _get_rdp_keyframe_times(self, curves: list[np.ndarray]) -> list:
+        """Frames kept by RDP on any of the curves, plus the start and end frame"""
         rdp_keyframes = set()
         rdp_keyframes.add(self.frame_start)  # Always include start
         rdp_keyframes.add(self.frame_end)    # Always include end
         
-        for bone in bones:
-            rna_data_stub = f'pose.bones["{bone.name}"]'
-            
-            # Process each animation channel separately
-            for prop in ['location', 'rotation_quaternion', 'rotation_euler', 'scale']:
-                prop_sizes = {'location': 3, 'rotation_quaternion': 4, 'rotation_euler': 3, 'scale': 3}
-                
-                for axis_index in range(prop_sizes[prop]):
-                    fcurve = fcurves.find(rna_data_stub + '.' + prop, index=axis_index)
-                    if fcurve and len(fcurve.keyframe_points) > 2:
-                        # Extract keyframe data as (frame, value) points
-                        points = [(kf.co[0], kf.co[1]) for kf in fcurve.keyframe_points]
-                        points.sort(key=lambda x: x[0])  # Sort by frame
-                        
-                        # Apply RDP algorithm to this curve
-                        if len(points) > 2:
-                            simplified_points = self._rdp_simplify(points, self.rdp_tolerance)
-                            
-                            # Add frames to keyframe set, respecting min distance
-                            for frame, value in simplified_points:
-                                rdp_keyframes.add(int(frame))
+        if curves:
+            points = np.concatenate(curves)
+            keep = self._rdp_simplify_batched(curves, self.rdp_tolerance)
+            rdp_keyframes.update(int(frame) for frame in points[keep, 0].tolist())
         
         # Enforce minimum frame distance
         if self.rdp_min_distance > 1:
@@ -911,67 +1617,73 @@ class AnmBuilder:
         
         return sorted(rdp_keyframes)
     
-    def _rdp_simplify(self, points, tolerance):
-        """Ramer-Douglas-Peucker algorithm implementation"""
-        if len(points) <= 2:
-            return points
-        
-        # Find the point with the maximum distance from line between start and end
-        start = points[0]
-        end = points[-1]
-        max_dist = 0
-        max_index = 0
-        
-        for i in range(1, len(points) - 1):
-            dist = self._point_line_distance(points[i], start, end)
-            if dist > max_dist:
-                max_dist = dist
-                max_index = i
-        
-        # If max distance is greater than tolerance, recursively simplify
-        if max_dist > tolerance:
-            # Recursively simplify the two segments
-            left_segment = self._rdp_simplify(points[:max_index + 1], tolerance)
-            right_segment = self._rdp_simplify(points[max_index:], tolerance)
+    @staticmethod
+    def _rdp_simplify_batched(curves: list[np.ndarray], tolerance: float) -> np.ndarray:
+        """Ramer-Douglas-Peucker on many (n, 2) curves at once.
+        
+        Returns a mask over the concatenated points of the points that are kept.
+        Instead of recursing, every pending segment of every curve is split in the
+        same pass, so the number of passes is the recursion depth of the classic
+        algorithm. Split points are chosen exactly like the recursive version
+        (first point of maximum distance to the start-end segment).
+        """
+        lengths = np.array([len(curve) for curve in curves], dtype=np.int64)
+        if not len(lengths):
+            return np.zeros(0, dtype=bool)
+        points = np.concatenate(curves)
+        px, py = points[:, 0], points[:, 1]
+        
+        ends = np.cumsum(lengths) - 1
+        starts = ends - lengths + 1
+        keep = np.zeros(len(points), dtype=bool)
+        keep[starts] = True
+        keep[ends] = True
+        
+        pending = ends - starts > 1
+        starts, ends = starts[pending], ends[pending]
+        while len(starts):
+            # Interior points of all pending segments, grouped by segment
+            counts = ends - starts - 1
+            group_offsets = np.cumsum(counts) - counts
+            segment = np.repeat(np.arange(len(starts)), counts)
+            index = np.arange(counts.sum()) - group_offsets[segment] + starts[segment] + 1
             
-            # Combine results (remove duplicate middle point)
-            return left_segment[:-1] + right_segment
-        else:
-            # All points between start and end can be approximated by a straight line
-            return [start, end]
-    
-    def _point_line_distance(self, point, line_start, line_end):
-        """Calculate perpendicular distance from point to line"""
-        px, py = point
-        x1, y1 = line_start
-        x2, y2 = line_end
-        
-        # Calculate the distance from point to line segment
-        A = px - x1
-        B = py - y1
-        C = x2 - x1
-        D = y2 - y1
-        
-        dot = A * C + B * D
-        len_sq = C * C + D * D
-        
-        if len_sq == 0:
-            # Line is actually a point
-            return ((px - x1) ** 2 + (py - y1) ** 2) ** 0.5
-        
-        param = dot / len_sq
-        
-        if param < 0:
-            xx, yy = x1, y1
-        elif param > 1:
-            xx, yy = x2, y2
-        else:
-            xx = x1 + param * C
-            yy = y1 + param * D
+            x1, y1 = px[starts][segment], py[starts][segment]
+            x2, y2 = px[ends  ][segment], py[ends  ][segment]
+            A = px[index] - x1
+            B = py[index] - y1
+            C = x2 - x1
+            D = y2 - y1
+            dot = A * C + B * D
+            len_sq = C * C + D * D
+            
+            # Distance to the segment, clamped to its end points
+            with np.errstate(divide='ignore', invalid='ignore'):
+                param = dot / len_sq
+            xx = np.where(param < 0, x1, np.where(param > 1, x2, x1 + param * C))
+            yy = np.where(param < 0, y1, np.where(param > 1, y2, y1 + param * D))
+            dx = px[index] - xx
+            dy = py[index] - yy
+            # A zero length segment is a point
+            is_point = len_sq == 0
+            dx[is_point] = A[is_point]
+            dy[is_point] = B[is_point]
+            dist = np.power(dx * dx + dy * dy, 0.5)
+            
+            max_dist = np.fmax.reduceat(dist, group_offsets)
+            is_split = max_dist > tolerance
+            
+            # First point that reaches the maximum of its segment
+            position = np.where(dist == max_dist[segment], np.arange(len(dist)), len(dist))
+            split = index[np.minimum.reduceat(position, group_offsets)[is_split]]
+            keep[split] = True
+            
+            starts, ends = starts[is_split], ends[is_split]
+            starts, ends = np.concatenate((starts, split)), np.concatenate((split, ends))
+            pending = ends - starts > 1
+            starts, ends = starts[pending], ends[pending]
         
-        dx = px - xx
-        dy = py - yy
-        return (dx * dx + dy * dy) ** 0.5
+        return keep
     
     def _enforce_min_distance(self, keyframes, min_distance):
         """Enforce minimum distance between keyframes"""
@@ -1013,18 +1725,12 @@ class AnmBuilder:
         
         #is_mismatch = not np.allclose(a, b, atol=1e-6)
         
+        # Same comparison as get_clean_keyframe_mask(), a change in either direction counts
         diff = a - b
-        if isinstance(current_value, Vector):
-            is_mismatch = (   diff.x >= 1e-6
-                           or diff.y >= 1e-6
-                           or diff.z >= 1e-6)
-        elif isinstance(current_value, Quaternion):
-            is_mismatch = (   diff.x >= 1e-6
-                           or diff.y >= 1e-6
-                           or diff.z >= 1e-6
-                           or diff.w >= 1e-6)
+        if isinstance(current_value, (Vector, Quaternion)):
+            is_mismatch = any(abs(component) >= 1e-6 for component in diff)
         else:
-            is_mismatch = diff >= 1e-6
+            is_mismatch = abs(diff) >= 1e-6
         
         new_keydict: dict[float, Vector | Quaternion] = {}
         if is_mismatch:
@@ -1052,6 +1758,7 @@ class AnmBuilder:
         anm_data_raw = {}
 
         prop_sizes = {'location': 3, 'rotation_quaternion': 4, 'rotation_euler': 3, 'scale': 3}
+        fcurve_index = FCurveIndex.get(fcurves)
         
         #class KeyFrame:
         #    def __init__(self, time, value):
@@ -1061,15 +1768,7 @@ class AnmBuilder:
         #same_rots = {}
         #pre_rots = {}
         
-        def _convert_loc(pose_bone, loc):
-            loc = Vector(loc)
-            loc = compat.mul(pose_bone.bone.matrix_local, loc)
-            if pose_bone.parent:
-                loc = compat.mul(pose_bone.parent.bone.matrix_local.inverted(), loc)
-                loc = compat.convert_bl_to_cm_bone_space(loc)
-            else:
-                loc = compat.convert_bl_to_cm_space(loc)
-            return loc * self.scale
+        _convert_loc = self._convert_keyed_loc
         """
         def _convert_quat(pose_bone, quat):
             #quat = Quaternion(quat)
@@ -1104,20 +1803,7 @@ class AnmBuilder:
             return quat
         """
 
-        def _convert_quat(pose_bone, quat):
-            bone_quat = pose_bone.bone.matrix.to_quaternion()
-            quat = Quaternion(quat)
-
-            '''Can't use matrix transforms here as they would mess up interpolation.'''
-            quat = compat.mul(bone_quat, quat)
-            
-            if pose_bone.bone.parent:
-                #quat.w, quat.x, quat.y, quat.z = quat.w, -quat.z, quat.x, -quat.y
-                quat.w, quat.y, quat.x, quat.z = quat.w, -quat.z, quat.y, -quat.x
-            else:
-                quat = compat.mul(Matrix.Rotation(math.radians(90.0), 4, 'Z').to_quaternion(), quat)
-                quat.w, quat.y, quat.x, quat.z = quat.w, -quat.z, quat.y, -quat.x
-            return quat
+        _convert_quat = self._convert_keyed_quat
 
         for prop, prop_keyed_bones in keyed_bones.items():
             #self.report(type={'INFO'}, message=f_tip_("{prop} {list}", prop=prop, list=prop_keyed_bones))
@@ -1129,8 +1815,7 @@ class AnmBuilder:
                 
                 pose_bone = pose.bones[bone_name]
                 rna_data_path = f'pose.bones["{bone_name}"].{prop}'
-                prop_fcurves = [ fcurves.find(rna_data_path, index=axis_index) 
-                                 for axis_index in range(prop_sizes[prop]) ]
+                prop_fcurves = fcurve_index.get_prop(bone_name, prop)
                 
                 # Create missing fcurves, and make existing fcurves CM3D2 compatible.
                 for axis_index, fcurve in enumerate(prop_fcurves):
@@ -1214,34 +1899,171 @@ class AnmBuilder:
         
         return anm_data_raw
 
+    def _convert_keyed_loc(self, pose_bone: bpy.types.PoseBone, loc) -> Vector:
+        loc = Vector(loc)
+        loc = compat.mul(pose_bone.bone.matrix_local, loc)
+        if pose_bone.parent:
+            loc = compat.mul(pose_bone.parent.bone.matrix_local.inverted(), loc)
+            loc = compat.convert_bl_to_cm_bone_space(loc)
+        else:
+            loc = compat.convert_bl_to_cm_space(loc)
+        return loc * self.scale
+    
+    @staticmethod
+    def _convert_keyed_quat(pose_bone: bpy.types.PoseBone, quat) -> Quaternion:
+        bone_quat = pose_bone.bone.matrix.to_quaternion()
+        quat = Quaternion(quat)
+
+        '''Can't use matrix transforms here as they would mess up interpolation.'''
+        quat = compat.mul(bone_quat, quat)
+        
+        if pose_bone.bone.parent:
+            #quat.w, quat.x, quat.y, quat.z = quat.w, -quat.z, quat.x, -quat.y
+            quat.w, quat.y, quat.x, quat.z = quat.w, -quat.z, quat.y, -quat.x
+        else:
+            quat = compat.mul(Matrix.Rotation(math.radians(90.0), 4, 'Z').to_quaternion(), quat)
+            quat.w, quat.y, quat.x, quat.z = quat.w, -quat.z, quat.y, -quat.x
+        return quat
+    
+    def get_animation_keyframes_read_only(self, context, pose, keyed_bones, fcurves):
+        """KEYED export that leaves the action untouched.
+        
+        get_animation_keyframes() converts a copy of the action with an operator and
+        inserts the missing keyframes. Here values and tangents are computed from the
+        FCurves directly: tangents come from the Bezier handles or the chord of LINEAR
+        segments, and components without a keyframe at some time are evaluated at that
+        time. A missing FCurve gives 0 with flat tangents, like the empty FCurve the
+        legacy path creates.
+        
+        Not identical to the legacy output for the other interpolations: CONSTANT
+        segments get flat tangents, and easings get the slope of the evaluated curve,
+        where the legacy path uses whatever handles the conversion operator leaves.
+        This is why the option is off by default.
+        """
+        fps = context.scene.render.fps
+        fcurve_index = FCurveIndex.get(fcurves)
+        
+        anm_data_raw = {}
+        channel_keys = {'location': ('LOC', self._convert_keyed_loc), 'rotation_quaternion': ('ROT', self._convert_keyed_quat)}
+        for prop, prop_keyed_bones in keyed_bones.items():
+            if prop not in channel_keys:
+                continue
+            key, convert = channel_keys[prop]
+            for bone_name in prop_keyed_bones:
+                pose_bone = pose.bones[bone_name]
+                rna_data_path = f'pose.bones["{bone_name}"].{prop}'
+                prop_fcurves = fcurve_index.get_prop(bone_name, prop)
+                
+                curves = [self._get_fcurve_keyframes(fcurve) if fcurve else None for fcurve in prop_fcurves]
+                frames = np.unique(np.concatenate([curve['co'][:, 0] for curve in curves if curve is not None]))
+                
+                values = np.empty((len(frames), len(prop_fcurves)))
+                tangents_in = np.zeros_like(values)
+                tangents_out = np.zeros_like(values)
+                for axis_index, (fcurve, curve) in enumerate(zip(prop_fcurves, curves)):
+                    if fcurve is None:
+                        values[:, axis_index] = 0.0
+                        self.reporter.report(
+                            type={'WARNING'},
+                            message=f_tip_("Missing FCurve for {path}[{index}], using 0",
+                                           path=rna_data_path, index=axis_index)
+                        )
+                        continue
+                    self._fill_keyed_axis(fcurve, curve, frames, values[:, axis_index], tangents_in[:, axis_index], tangents_out[:, axis_index], rna_data_path, axis_index)
+                tangents_in *= fps
+                tangents_out *= fps
+                
+                bone_data = anm_data_raw.setdefault(bone_name, {})
+                bone_data[key], bone_data[key + '_IN'], bone_data[key + '_OUT'] = {}, {}, {}
+                for frame, value, tangent_in, tangent_out in zip(frames.tolist(), values.tolist(), tangents_in.tolist(), tangents_out.tolist()):
+                    time = frame / fps * (1.0 / self.time_scale)
+                    bone_data[key         ][time] = convert(pose_bone, value)
+                    bone_data[key + '_IN' ][time] = convert(pose_bone, tangent_in)
+                    bone_data[key + '_OUT'][time] = convert(pose_bone, tangent_out)
+        
+        return anm_data_raw
+    
+    @staticmethod
+    def _get_fcurve_keyframes(fcurve: bpy.types.FCurve) -> dict[str, np.ndarray]:
+        """co, handle_left, handle_right (n, 2) arrays and interpolation names of the keyframes, sorted by frame"""
+        keyframe_points = fcurve.keyframe_points
+        count = len(keyframe_points)
+        curve = {}
+        for attr in ('co', 'handle_left', 'handle_right'):
+            data = np.empty(count * 2, dtype=np.float32)
+            keyframe_points.foreach_get(attr, data)
+            curve[attr] = data.astype(np.float64).reshape(-1, 2)
+        curve['interpolation'] = np.array([keyframe.interpolation for keyframe in keyframe_points])
+        order = np.argsort(curve['co'][:, 0], kind='stable')
+        return {attr: data[order] for attr, data in curve.items()}
+    
+    def _fill_keyed_axis(self, fcurve, curve, frames, values, tangents_in, tangents_out, rna_data_path, axis_index):
+        """Values and per-frame tangents of one FCurve at frames (keyframe times of all axes)"""
+        co, handle_left, handle_right, interpolation = curve['co'], curve['handle_left'], curve['handle_right'], curve['interpolation']
+        x, y = co[:, 0], co[:, 1]
+        
+        def handle_slope(handle):
+            run = handle[:, 0] - x
+            return np.divide(handle[:, 1] - y, run, out=np.zeros_like(run), where=run != 0)
+        
+        key_in = handle_slope(handle_left)
+        key_out = handle_slope(handle_right)
+        # The interpolation of a keyframe applies to the segment after it
+        if len(x) > 1:
+            segment = interpolation[:-1]
+            chord = np.diff(y) / np.where(np.diff(x) != 0, np.diff(x), np.inf)
+            is_linear = segment == 'LINEAR'
+            key_out[:-1][is_linear] = chord[is_linear]
+            key_in[1:][is_linear] = chord[is_linear]
+            # A step can not be written as a Hermite segment, hold the values with flat tangents
+            is_constant = segment == 'CONSTANT'
+            key_out[:-1][is_constant] = 0.0
+            key_in[1:][is_constant] = 0.0
+            step = 1e-3
+            for i in np.flatnonzero(~np.isin(segment, ('BEZIER', 'LINEAR', 'CONSTANT'))).tolist():
+                key_out[i] = (fcurve.evaluate(x[i] + step) - y[i]) / step
+                key_in[i + 1] = (y[i + 1] - fcurve.evaluate(x[i + 1] - step)) / step
+        
+        key_indices = np.searchsorted(x, frames)
+        is_key = (key_indices < len(x)) & (x[np.minimum(key_indices, len(x) - 1)] == frames)
+        values[is_key] = y[key_indices[is_key]]
+        tangents_in[is_key] = key_in[key_indices[is_key]]
+        tangents_out[is_key] = key_out[key_indices[is_key]]
+        
+        # Components that have no keyframe at a time other components have one
+        step = 1e-3
+        for i in np.flatnonzero(~is_key).tolist():
+            frame = frames[i]
+            values[i] = fcurve.evaluate(frame)
+            tangents_in[i] = tangents_out[i] = (fcurve.evaluate(frame + step) - fcurve.evaluate(frame - step)) / (2 * step)
+            self.reporter.report(
+                type={'WARNING'},
+                message=f_tip_("Evaluating missing keyframe @ frame {frame} for {path}[{index}]",
+                               path=rna_data_path, index=axis_index, frame=frame)
+            )
+    
     def collect_raw_animation_data(self, context, obj: bpy.types.Object, bone_parents):
         arm = obj.data
         pose = obj.pose
         
         copied_action = None
         keyed_bones = None
-        has_animation_action = obj.animation_data and obj.animation_data.action
+        has_animation_action = self.check_animation_data(obj)
         if has_animation_action:
-            if self.export_method == 'KEYED': # This method modifies the action, so copy it.
+            if self.export_method == 'KEYED' and not self.is_keyed_read_only: # This method modifies the action, so copy it.
                 copied_action = obj.animation_data.action.copy()
                 copied_action.name = obj.animation_data.action.name + "__anm_export"
                 fcurves = copied_action.fcurves
             else:
                 fcurves = obj.animation_data.action.fcurves
             keyed_bones = self.get_keyed_bones(arm, fcurves)
-        elif self.export_method == 'KEYED' or self.export_method == 'DIRECT_OPTIMIZED' or self.is_remove_unkeyed_bone:
-            if not has_animation_action:
-                raise common.CM3D2ExportError(
-                    "Active armature has no animation data / action. Please use \"{method}\" with \"{option}\" disabled, or bake keyframes before exporting.".format(
-                        method = "Bake All Frames",
-                        option = "Remove Unkeyed Bones"
-                    )
-                )
 
         bones = self.clean_bone_list(arm, bone_parents, keyed_bones)
 
         if self.export_method == 'ALL':
             anm_data_raw = self.get_animation_frames(context, pose, bones, bone_parents)
+        elif self.export_method == 'KEYED' and self.is_keyed_read_only:
+            anm_data_raw = self.get_animation_keyframes_read_only(context, pose, keyed_bones, fcurves)
         elif self.export_method == 'KEYED':
             anm_data_raw = self.get_animation_keyframes(context, pose, keyed_bones, fcurves)
         elif self.export_method == 'DIRECT_OPTIMIZED':
@@ -1252,146 +2074,109 @@ class AnmBuilder:
                                    
         return bones, anm_data_raw
 
+    def check_animation_data(self, obj: bpy.types.Object) -> bool:
+        """Returns whether obj has an action, raises if the export settings require one"""
+        has_animation_action = bool(obj.animation_data and obj.animation_data.action)
+        if not has_animation_action and (self.export_method == 'KEYED' or self.export_method == 'DIRECT_OPTIMIZED' or self.is_remove_unkeyed_bone):
+            raise common.CM3D2ExportError(
+                "Active armature has no animation data / action. Please use \"{method}\" with \"{option}\" disabled, or bake keyframes before exporting.".format(
+                    method = "Bake All Frames",
+                    option = "Remove Unkeyed Bones"
+                )
+            )
+        return has_animation_action
+
     @staticmethod
     def get_bone_parents(arm: bpy.types.Armature, use_armature_property = False) -> dict[str, bpy.types.Bone]:
-        bone_parents: dict[str, bpy.types.Bone] = {}
-        if use_armature_property:
-            for i in range(9999):
-                name = "BoneData:" + str(i)
-                if name not in arm:
-                    continue
-                elems = arm[name].split(",")
-                if len(elems) != 5:
-                    continue
-                if elems[0] in arm.bones:
-                    if elems[2] in arm.bones:
-                        bone_parents[elems[0]] = arm.bones[elems[2]]
-                    else:
-                        bone_parents[elems[0]] = None
-            for bone in arm.bones:
-                if bone.name in bone_parents:
-                    continue
-                bone_parents[bone.name] = bone.parent
-        else:
-            for bone in arm.bones:
-                bone_parents[bone.name] = bone.parent
-        return bone_parents
+        hierarchy = ArmatureHierarchy.get(arm, use_armature_property)
+        bones = {bone.name: bone for bone in arm.bones}
+        return {name: bones[parent] if parent else None for name, parent in hierarchy.parents.items()}
     
-    @staticmethod
-    def get_keyed_bones(arm: bpy.types.Armature, fcurves):
+    def get_keyed_bones(self, arm: bpy.types.Armature, fcurves):
+        fcurve_index = FCurveIndex.get(fcurves)
         keyed_bones = {'location': [], 'rotation_quaternion': [], 'rotation_euler': [], 'scale': []}
         for bone in arm.bones:
             bone: bpy.types.Bone
-            rna_data_stub = f'pose.bones["{bone.name}"]'
-            for prop, axes in [('location', 3), ('rotation_quaternion', 4), ('rotation_euler', 3), ('scale', 3)]:
-                found_fcurve = False
-                for axis_index in range(0, axes):
-                    if fcurves.find(rna_data_stub + '.' + prop, index=axis_index):
-                        found_fcurve = True
-                        break
-                if found_fcurve:
-                    keyed_bones[prop].append(bone.name)
+            for prop, bone_names in keyed_bones.items():
+                if fcurve_index.has(bone.name, prop):
+                    bone_names.append(bone.name)
         return keyed_bones
-
+    
     def clean_bone_list(self, arm, bone_parents, keyed_bones):
-        def is_japanese(string):
-            for ch in string:
-                name = unicodedata.name(ch)
-                if 'CJK UNIFIED' in name or 'HIRAGANA' in name or 'KATAKANA' in name:
-                    return True
-            return False
-        
-        def is_keyed(bone):
-            for prop in keyed_bones:
-                if bone.name in keyed_bones[prop]:
-                    return True
-            return False
-        
-        def should_remove(bone):
-            if self.is_remove_serial_number_bone and common.has_serial_number(bone.name):
-                return True
-            if self.is_remove_japanese_bone and is_japanese(bone.name):
-                return True
-            if self.is_remove_unkeyed_bone and not is_keyed(bone):
-                return True
-            return False
-        
-        bones = []
-        already_bone_names = []
-        bones_queue = arm.bones[:]
-        while len(bones_queue):
-            bone = bones_queue.pop(0)
-
-            if not bone_parents[bone.name]:
-                already_bone_names.append(bone.name)
-                if should_remove(bone):
-                    continue
-                if self.is_remove_alone_bone and len(bone.children) == 0:
-                    continue
-                bones.append(bone)
-                continue
-            elif bone_parents[bone.name].name in already_bone_names:
-                already_bone_names.append(bone.name)
-                if should_remove(bone):
-                    continue
-                if self.is_remove_ik_bone:
-                    bone_name_low = bone.name.lower()
-                    if '_ik_' in bone_name_low or bone_name_low.endswith('_nub') or bone.name.endswith('Nub'):
-                        continue
-                bones.append(bone)
-                continue
-
-
-            bones_queue.append(bone)
-        return bones
+        hierarchy = self.get_hierarchy(arm, bone_parents)
+        
+        keyed_bone_names = None
+        if self.is_remove_unkeyed_bone:
+            keyed_bone_names = set()
+            for names in (keyed_bones or {}).values():
+                keyed_bone_names.update(names)
+        
+        names = hierarchy.filter(
+            is_remove_serial_number_bone = self.is_remove_serial_number_bone,
+            is_remove_japanese_bone      = self.is_remove_japanese_bone,
+            is_remove_alone_bone         = self.is_remove_alone_bone,
+            is_remove_ik_bone            = self.is_remove_ik_bone,
+            keyed_bone_names             = keyed_bone_names,
+        )
+        bones = {bone.name: bone for bone in arm.bones}
+        return [bones[name] for name in names]
+    
+    def get_hierarchy(self, arm: bpy.types.Armature, bone_parents: dict[str, bpy.types.Bone]) -> ArmatureHierarchy:
+        """Cached ArmatureHierarchy of arm that uses the parents in bone_parents"""
+        parent_names = {name: parent.name if parent else None for name, parent in bone_parents.items()}
+        hierarchy = ArmatureHierarchy.get(arm, self.bone_parent_from == 'ARMATURE_PROPERTY')
+        if hierarchy.parents == parent_names:
+            return hierarchy
+        # bone_parents did not come from get_bone_parents() with the current settings
+        bones = arm.bones
+        return ArmatureHierarchy(
+            [bone.name for bone in bones],
+            [bone.parent.name if bone.parent else None for bone in bones],
+            parent_names
+        )
+    
+    def get_bone_paths(self, bones, bone_parents) -> dict[str, str]:
+        """Unity-style 'root/child/...' path of each bone"""
+        if not bones:
+            return {}
+        paths = self.get_hierarchy(bones[0].id_data, bone_parents).paths
+        return {bone.name: paths.get(bone.name) or self.get_bone_path(bone, bone_parents) for bone in bones}
     
     def get_track_data(self, anm_data_raw):
-        track_data: dict[str, dict[Anm.ChannelIdType, dict[float, tuple[float, float, float]]]]
+        track_data: dict[str, dict[Anm.ChannelIdType, ChannelKeys]]
         track_data = {}
         for bone_name, channels in anm_data_raw.items():
-            track_data[bone_name] = {
-                Anm.ChannelIdType.LocalRotationX: {},
-                Anm.ChannelIdType.LocalRotationY: {},
-                Anm.ChannelIdType.LocalRotationZ: {},
-                Anm.ChannelIdType.LocalRotationW: {},
-                Anm.ChannelIdType.LocalPositionX: {},
-                Anm.ChannelIdType.LocalPositionY: {},
-                Anm.ChannelIdType.LocalPositionZ: {},
-                Anm.ChannelIdType.ExLocalScaleX : {},
-                Anm.ChannelIdType.ExLocalScaleY : {},
-                Anm.ChannelIdType.ExLocalScaleZ : {}
-            }
-            if self.is_location and channels.get('LOC'):
-                has_tangents = bool(channels.get('LOC_IN') and channels.get('LOC_OUT'))
-                for t, loc in channels['LOC'].items():
-                    tangent_in  = channels['LOC_IN' ][t] if has_tangents else Vector()
-                    tangent_out = channels['LOC_OUT'][t] if has_tangents else Vector()
-                    track_data[bone_name][Anm.ChannelIdType.LocalPositionX][t] = (loc.x, tangent_in.x, tangent_out.x)
-                    track_data[bone_name][Anm.ChannelIdType.LocalPositionY][t] = (loc.y, tangent_in.y, tangent_out.y)
-                    track_data[bone_name][Anm.ChannelIdType.LocalPositionZ][t] = (loc.z, tangent_in.z, tangent_out.z)
-            if self.is_rotation and channels.get('ROT'):
-                has_tangents = bool(channels.get('ROT_IN') and channels.get('ROT_OUT'))
-                for t, rot in channels['ROT'].items():
-                    tangent_in  = channels['ROT_IN' ][t] if has_tangents else Quaternion((0,0,0,0))
-                    tangent_out = channels['ROT_OUT'][t] if has_tangents else Quaternion((0,0,0,0))
-                    track_data[bone_name][Anm.ChannelIdType.LocalRotationX][t] = (rot.x, tangent_in.x, tangent_out.x)
-                    track_data[bone_name][Anm.ChannelIdType.LocalRotationY][t] = (rot.y, tangent_in.y, tangent_out.y)
-                    track_data[bone_name][Anm.ChannelIdType.LocalRotationZ][t] = (rot.z, tangent_in.z, tangent_out.z)
-                    track_data[bone_name][Anm.ChannelIdType.LocalRotationW][t] = (rot.w, tangent_in.w, tangent_out.w)
-            if self.is_scale and channels.get('SCL'):
-                has_tangents = bool(channels.get('SCL_IN') and channels.get('SCL_OUT'))
-                for t, scl in channels['SCL'].items():
-                    tangent_in  = channels['SCL_IN' ][t] if has_tangents else Vector()
-                    tangent_out = channels['SCL_OUT'][t] if has_tangents else Vector()
-                    track_data[bone_name][Anm.ChannelIdType.ExLocalScaleX][t] = (scl.x, tangent_in.x, tangent_out.x)
-                    track_data[bone_name][Anm.ChannelIdType.ExLocalScaleY][t] = (scl.y, tangent_in.y, tangent_out.y)
-                    track_data[bone_name][Anm.ChannelIdType.ExLocalScaleZ][t] = (scl.z, tangent_in.z, tangent_out.z)
-            
-            # Remove empty channels
-            track_data[bone_name] = {id: ch for id, ch in track_data[bone_name].items()
-                                     if len(ch) > 0}
+            if all(isinstance(keys, ChannelKeys) for keys in channels.values()):
+                track_data[bone_name] = channels # Batched sampling already gives columnar channels
+            else:
+                track_data[bone_name] = self.get_bone_track_data(channels)
         return track_data
     
+    def get_bone_track_data(self, channels) -> dict[Anm.ChannelIdType, ChannelKeys]:
+        """Columnar channels of a bone from its {time: Vector / Quaternion} LOC, ROT, SCL (and _IN/_OUT tangent) dicts"""
+        bone_track = {}
+        for is_enabled, key, channel_components in (
+            (self.is_location, 'LOC', self.LOC_CHANNELS),
+            (self.is_rotation, 'ROT', self.ROT_CHANNELS),
+            (self.is_scale   , 'SCL', self.SCL_CHANNELS),
+        ):
+            values = channels.get(key)
+            if not is_enabled or not values:
+                continue
+            times = sorted(values)
+            value_rows = np.array([tuple(values[t]) for t in times], dtype=np.float32)
+            tangents_in = tangents_out = None
+            if channels.get(key + '_IN') and channels.get(key + '_OUT'):
+                tangents_in  = np.array([tuple(channels[key + '_IN' ][t]) for t in times], dtype=np.float32)
+                tangents_out = np.array([tuple(channels[key + '_OUT'][t]) for t in times], dtype=np.float32)
+            for channel_id, component in channel_components:
+                bone_track[channel_id] = ChannelKeys(
+                    times, value_rows[:, component],
+                    tangents_in[:, component] if tangents_in is not None else None,
+                    tangents_out[:, component] if tangents_out is not None else None,
+                )
+        return bone_track
+    
     #@staticmethod
     def assemble_anm(self, bone_parents, bones, track_data, time_step, version=1000, auto_smooth=False) -> Anm:
         ''' Build Anm class from data'''
@@ -1403,21 +2188,16 @@ class AnmBuilder:
         # Finding generic types can be slow, so do it once here
         PopulateList_Channel_ = PerformanceExtensions.PopulateList[Anm.Channel]
         Array_Keyframe_ = Array[Anm.Keyframe]
+        use_bulk_transfer = self.is_bulk_keyframe_transfer and KeyframeTransfer.is_supported()
         
         bones_with_tracks = [ bone for bone in bones if track_data.get(bone.name) ]
+        bone_paths = self.get_bone_paths(bones_with_tracks, bone_parents)
         PerformanceExtensions.PopulateList[Anm.Track](anm.tracks, len(bones_with_tracks))
         for bone, track in zip(bones_with_tracks, anm.tracks):
             track: Anm.Track
             # track.channelId = 1
             
-            bone_names = [bone.name]
-            current_bone = bone
-            while bone_parents[current_bone.name]:
-                bone_names.append(bone_parents[current_bone.name].name)
-                current_bone = bone_parents[current_bone.name]
-            bone_names.reverse()
-            
-            track.path = '/'.join(bone_names)
+            track.path = bone_paths[bone.name]
             
             PerformanceExtensions.PopulateList[Anm.Channel](
                 track.channels, len(track_data[bone.name])
@@ -1428,64 +2208,186 @@ class AnmBuilder:
                     sorted(track_data[bone.name].items(), key=lambda x: x[0])):
                 channel: Anm.Channel
                 channel.channelId = channel_id
-                len_keyframes = len(keyframes)
+                rows = self.get_keyframe_rows(keyframes, time_step, auto_smooth)
+                len_keyframes = len(rows)
                 channel_keyframes = Array_Keyframe_(len_keyframes)
                 channel.keyframes.UnsafeSetArray(channel_keyframes)
-
-                keyframes_list = sorted(keyframes.items(), key=lambda x: x[0])
-                for i in range(len(keyframes_list)):
+                self._count('keyframes_out', len_keyframes)
+                
+                if use_bulk_transfer:
+                    KeyframeTransfer.copy(channel_keyframes, rows)
+                    self._count('interop_calls', 3 + KeyframeTransfer.INTEROP_CALLS)
+                    continue
+                
+                # channelId, array construction and UnsafeSetArray, then a get, 4 field sets and a set per keyframe
+                self._count('interop_calls', 3 + 6 * len_keyframes)
+                for i, (x, y, tan_in, tan_out) in enumerate(rows.tolist()):
                     keyframe: Anm.Keyframe = channel_keyframes[i]
-                    
-                    x = keyframes_list[i][0]
-                    y, dydx_in, dydx_out = keyframes_list[i][1]
 
                     keyframe.time = x
                     keyframe.value = y
-                    keyframe.inTangent = dydx_in
-                    keyframe.outTangent = dydx_out
-                    
-                    if len(keyframes_list) <= 1:
-                        keyframe.inTangent = 0.0
-                        keyframe.outTangent = 0.0
-                    elif auto_smooth:
-                        tan_in, tan_out = AnmBuilder.auto_calc_tangents(time_step, keyframes_list, i)
-                        
-                        keyframe.inTangent = tan_in
-                        keyframe.outTangent = tan_out
+                    keyframe.inTangent = tan_in
+                    keyframe.outTangent = tan_out
 
                     channel_keyframes[i] = keyframe
                        
         return anm
 
+    def write_anm_data(self, file, bone_parents, bones, track_data, time_step, version=1000, auto_smooth=False) -> int:
+        """Write track data as a CM3D2_ANIM file.
+        
+        Produces the same bytes as serializing the result of assemble_anm() with the
+        same arguments, but packs whole keyframe blocks instead of building .NET objects.
+        Returns the number of bytes written.
+        """
+        size = self.write_header(file, version)
+        bone_paths = self.get_bone_paths(bones, bone_parents)
+        
+        for bone in bones:
+            channels = track_data.get(bone.name)
+            if not channels:
+                continue
+            size += self.write_track(file, bone_paths[bone.name], channels, time_step, auto_smooth)
+        
+        size += self.write_footer(file, version)
+        return size
+
+    def dump_anm_data(self, path: str, bone_parents, bones, track_data, time_step, auto_smooth=False):
+        """Write track data as a binary AnmData file, with the same rows the .anm writers produce"""
+        bone_paths = self.get_bone_paths(bones, bone_parents)
+        tracks = []
+        for bone in bones:
+            channels = track_data.get(bone.name)
+            if not channels:
+                continue
+            tracks.append((bone.name, bone_paths[bone.name], {
+                int(channel_id): self.get_keyframe_rows(keys, time_step, auto_smooth)
+                for channel_id, keys in sorted(channels.items(), key=lambda x: x[0])
+            }))
+        file = common.open_temporary(path, 'wb', is_backup=False)
+        with self._stage('dump_anm_data'), file:
+            save_anm_data(file, tracks)
+    
+    def write_header(self, file, version=1000) -> int:
+        header = io.BytesIO()
+        common.write_str(header, 'CM3D2_ANIM')
+        header.write(_INT32.pack(version))
+        return self._write_bytes(file, header.getvalue())
+
+    def write_footer(self, file, version=1000) -> int:
+        footer = _BOOL.pack(False)
+        if version >= 1001:
+            footer += _BOOL.pack(False) + _BOOL.pack(False) # useMuneKeyL, useMuneKeyR
+        return self._write_bytes(file, footer)
+
+    def write_track(self, file, path: str, channels, time_step, auto_smooth=False) -> int:
+        """Write one track (path and all of its channels), returns the number of bytes written"""
+        buffer = io.BytesIO()
+        buffer.write(_BOOL.pack(True))
+        common.write_str(buffer, path)
+        for channel_id, keyframes in sorted(channels.items(), key=lambda x: x[0]):
+            rows = self.get_keyframe_rows(keyframes, time_step, auto_smooth)
+            self._count('keyframes_out', len(rows))
+            buffer.write(_CHANNEL_HEADER.pack(int(channel_id), len(rows)))
+            buffer.write(rows.astype('<f4').tobytes())
+        return self._write_bytes(file, buffer.getvalue())
+
     @staticmethod
-    def auto_calc_tangents(time_step, keyframes_list, i):
-        x = keyframes_list[i][0]
-        y = keyframes_list[i][1][0]
-        
-        if i == 0:
-            prev_x = x - (keyframes_list[i + 1][0] - x)
-            prev_y = y - (keyframes_list[i + 1][1][0] - y)
-            next_x = keyframes_list[i + 1][0]
-            next_y = keyframes_list[i + 1][1][0]
-        elif i == len(keyframes_list) - 1:
-            prev_x = keyframes_list[i - 1][0]
-            prev_y = keyframes_list[i - 1][1][0]
-            next_x = x + (x - keyframes_list[i - 1][0])
-            next_y = y + (y - keyframes_list[i - 1][1][0])
+    def get_keyframe_rows(keys: ChannelKeys, time_step, auto_smooth=False) -> np.ndarray:
+        """(time, value, inTangent, outTangent) rows of a channel, as assemble_anm() sets them"""
+        rows = np.empty((len(keys), 4), dtype=np.float64)
+        rows[:, 0] = keys.times
+        rows[:, 1] = keys.values
+        if len(keys) <= 1:
+            rows[:, 2:] = 0.0
+        elif auto_smooth:
+            rows[:, 2], rows[:, 3] = AnmBuilder.auto_calc_tangents_array(time_step, rows[:, 0], rows[:, 1])
         else:
-            prev_x = keyframes_list[i - 1][0]
-            prev_y = keyframes_list[i - 1][1][0]
-            next_x = keyframes_list[i + 1][0]
-            next_y = keyframes_list[i + 1][1][0]
+            rows[:, 2] = keys.tangents_in
+            rows[:, 3] = keys.tangents_out
+        return rows
+
+    @staticmethod
+    def _write_bytes(file, data: bytes) -> int:
+        file.write(data)
+        return len(data)
+
+    def verify_anm_file(self, source, bone_parents, bones, track_data, time_step, auto_smooth=False, tolerance=0.0) -> list[str]:
+        """Compare a written .anm file against the track data it was built from.
+        
+        Expected keyframes are computed exactly as the writers do (sorting, tangent rules)
+        and rounded to float32 like the file, so by default they must match exactly;
+        tolerance allows an absolute difference. Returns a list of mismatch descriptions,
+        empty when the file matches.
+        """
+        version, tracks = read_anm(source)
+        mismatches = []
+        expected_paths = set()
+        bone_paths = self.get_bone_paths(bones, bone_parents)
+        for bone in bones:
+            channels = track_data.get(bone.name)
+            if not channels:
+                continue
+            path = bone_paths[bone.name]
+            expected_paths.add(path)
+            if path not in tracks:
+                mismatches.append(f"Missing track '{path}'")
+                continue
+            written_channels = tracks[path]
+            for channel_id, keyframes in channels.items():
+                expected = self.get_keyframe_rows(keyframes, time_step, auto_smooth)
+                written = written_channels.get(int(channel_id))
+                if written is None:
+                    mismatches.append(f"Missing channel {int(channel_id)} in track '{path}'")
+                elif written.shape != expected.shape:
+                    mismatches.append(f"Channel {int(channel_id)} in track '{path}' has {len(written)} keyframes, expected {len(expected)}")
+                else:
+                    error = np.abs(written.astype(np.float64) - expected.astype('<f4'))
+                    if not np.all(error <= tolerance):
+                        row = int(np.argmax(error.max(axis=1)))
+                        mismatches.append(f"Channel {int(channel_id)} in track '{path}' differs by {error.max():g} at keyframe {row}")
+            for channel_id in written_channels.keys() - {int(channel_id) for channel_id in channels}:
+                mismatches.append(f"Unexpected channel {channel_id} in track '{path}'")
+        for path in tracks.keys() - expected_paths:
+            mismatches.append(f"Unexpected track '{path}'")
+        return mismatches
 
+    @staticmethod
+    def get_bone_path(bone: bpy.types.Bone, bone_parents: dict[str, bpy.types.Bone]) -> str:
+        bone_names = [bone.name]
+        current_bone = bone
+        while bone_parents[current_bone.name]:
+            bone_names.append(bone_parents[current_bone.name].name)
+            current_bone = bone_parents[current_bone.name]
+        bone_names.reverse()
+        return '/'.join(bone_names)
+
+    @staticmethod
+    def auto_calc_tangents_array(time_step, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Smooth in/out tangents of every keyframe of a channel (needs 2 or more keyframes).
+        
+        A tangent is the mean slope to both neighbours when that neighbour is within 1.5
+        time steps, otherwise the slope to the neighbour alone.
+        """
+        prev_x = np.empty_like(x)
+        prev_y = np.empty_like(y)
+        next_x = np.empty_like(x)
+        next_y = np.empty_like(y)
+        prev_x[1:], prev_y[1:] = x[:-1], y[:-1]
+        next_x[:-1], next_y[:-1] = x[1:], y[1:]
+        # Mirror the neighbour at both ends
+        prev_x[0] = x[0] - (x[1] - x[0])
+        prev_y[0] = y[0] - (y[1] - y[0])
+        next_x[-1] = x[-1] + (x[-1] - x[-2])
+        next_y[-1] = y[-1] + (y[-1] - y[-2])
+        
         prev_rad = (prev_y - y) / (prev_x - x)
         next_rad = (next_y - y) / (next_x - x)
         join_rad = (prev_rad + next_rad) / 2
-
-        tan_in  = join_rad if x - prev_x <= time_step * 1.5 else prev_rad
-        tan_out = join_rad if next_x - x <= time_step * 1.5 else next_rad
-        return tan_in,tan_out
-
+        
+        tan_in  = np.where(x - prev_x <= time_step * 1.5, join_rad, prev_rad)
+        tan_out = np.where(next_x - x <= time_step * 1.5, join_rad, next_rad)
+        return tan_in, tan_out
 
     def try_get_bone_inverse(self, bone: bpy.types.PoseBone, frame: float) -> Matrix | None:
         inverse = None
@@ -1511,6 +2413,1027 @@ class AnmBuilder:
         self._invalid_bones = {}
 
 
+_BOOL = struct.Struct('<?')
+_INT32 = struct.Struct('<i')
+_CHANNEL_HEADER = struct.Struct('<Bi')
+
+
+# Runs inside `blender --background` for AnmBuilder.sample_matrices_in_workers.
+# It only needs bpy and numpy, so workers can start with --factory-startup.
+_SAMPLE_WORKER_SOURCE = """
+import sys, json, bpy, numpy as np
+with open(sys.argv[sys.argv.index('--') + 1], encoding='utf-8') as job_file:
+    job = json.load(job_file)
+scene = bpy.data.scenes[job['scene']]
+view_layer = scene.view_layers[job['view_layer']]
+pose = bpy.data.objects[job['object']].pose
+pose_index = {pose_bone.name: i for i, pose_bone in enumerate(pose.bones)}
+index = np.array([pose_index[name] for name in job['bones']], dtype=np.intp)
+buffer = np.empty(len(pose.bones) * 16, dtype=np.float32)
+frames = job['frames']
+matrices = np.empty((len(frames), len(index), 4, 4), dtype=np.float32)
+for i, frame in enumerate(frames):
+    scene.frame_set(int(frame), subframe=frame - int(frame))
+    view_layer.update()
+    pose.bones.foreach_get('matrix', buffer)
+    matrices[i] = buffer.reshape(-1, 4, 4)[index].transpose(0, 2, 1)
+np.save(job['output'], matrices)
+"""
+
+
+class ExportProfiler:
+    """Wall-clock time per export stage plus named counters.
+    
+    Stages may nest; a stage entered more than once accumulates its time.
+    """
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self._started = time.perf_counter()
+    
+    @staticmethod
+    def measure(profiler: ExportProfiler | None, name: str):
+        """profiler.stage(name), or a no-op context when profiling is disabled"""
+        if profiler is None:
+            return contextlib.nullcontext()
+        return profiler.stage(name)
+    
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+    
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+    
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self._started
+    
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.stages.items())
+        counters = dict(self.counters)
+        if 'keyframes_in' in counters and 'keyframes_out' in counters:
+            # Side by side, with the share of keyframes that is written
+            keyframes_in, keyframes_out = counters.pop('keyframes_in'), counters.pop('keyframes_out')
+            ratio = f" ({keyframes_out / keyframes_in:.1%})" if keyframes_in else ""
+            counters['keyframes_in/out'] = f"{keyframes_in}/{keyframes_out}{ratio}"
+        counters = ", ".join(f"{name}={value}" for name, value in counters.items())
+        return f"Export took {self.total:.3f}s ({stages}) [{counters}]"
+    
+    def to_dict(self, **info) -> dict:
+        return {
+            'timestamp'    : time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'blender'      : bpy.app.version_string,
+            **info,
+            'total_seconds': self.total,
+            'stages'       : self.stages,
+            'counters'     : self.counters,
+        }
+    
+    def append_log(self, path: str, **info):
+        """Append one JSON record to a JSON Lines file"""
+        with open(path, 'a', encoding='utf-8') as log_file:
+            log_file.write(json.dumps(self.to_dict(**info)) + '\n')
+
+
+class FCurveIndex:
+    """Pose bone FCurves of an action by (bone name, property, axis), built in one pass.
+    
+    Replaces fcurves.find(), which scans every FCurve of the action on each call.
+    Indexes are cached per action and rebuilt when its FCurves change.
+    """
+    PROP_SIZES = {'location': 3, 'rotation_quaternion': 4, 'rotation_euler': 3, 'scale': 3}
+    
+    _cache: dict[int, FCurveIndex] = {}
+    _data_path_pattern = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]\.(location|rotation_quaternion|rotation_euler|scale)$')
+    _parsed_data_paths: dict[str, tuple[str, str] | None] = {}
+    
+    def __init__(self, fcurves, signature=None):
+        self.signature = signature
+        self.fcurves: dict[tuple[str, str, int], bpy.types.FCurve] = {}
+        for fcurve in fcurves:
+            parsed = self.parse_data_path(fcurve.data_path)
+            if parsed is None:
+                continue
+            bone_name, prop = parsed
+            if fcurve.array_index < self.PROP_SIZES[prop]:
+                # Like fcurves.find(), the first matching FCurve wins
+                self.fcurves.setdefault((bone_name, prop, fcurve.array_index), fcurve)
+        
+        self.keyed_props: set[tuple[str, str]] = {(bone_name, prop) for bone_name, prop, _ in self.fcurves}
+    
+    @classmethod
+    def get(cls, fcurves) -> FCurveIndex:
+        signature = tuple((fcurve.as_pointer(), fcurve.data_path, fcurve.array_index) for fcurve in fcurves)
+        key = fcurves.id_data.as_pointer()
+        fcurve_index = cls._cache.get(key)
+        if fcurve_index is None or fcurve_index.signature != signature:
+            fcurve_index = cls._cache[key] = cls(fcurves, signature)
+        return fcurve_index
+    
+    @classmethod
+    def parse_data_path(cls, data_path: str) -> tuple[str, str] | None:
+        """'pose.bones["name"].prop' -> (name, prop), None for other data paths"""
+        parsed = cls._parsed_data_paths.get(data_path, False)
+        if parsed is False:
+            match = cls._data_path_pattern.match(data_path)
+            parsed = None
+            if match:
+                bone_name = re.sub(r'\\(.)', r'\1', match.group(1))
+                parsed = (bone_name, match.group(2))
+            cls._parsed_data_paths[data_path] = parsed
+        return parsed
+    
+    def find(self, bone_name: str, prop: str, axis_index: int) -> bpy.types.FCurve | None:
+        return self.fcurves.get((bone_name, prop, axis_index))
+    
+    def get_prop(self, bone_name: str, prop: str) -> list[bpy.types.FCurve | None]:
+        """FCurve or None for each axis of the property"""
+        return [self.fcurves.get((bone_name, prop, axis_index)) for axis_index in range(self.PROP_SIZES[prop])]
+    
+    def has(self, bone_name: str, prop: str) -> bool:
+        return (bone_name, prop) in self.keyed_props
+
+
+class ArmatureHierarchy:
+    """Parents, processing order, paths and name-based filter flags of an armature's bones.
+    
+    All of it depends only on the bones and their BoneData properties, so instances are
+    cached per armature and reused until either changes.
+    """
+    _cache: dict[tuple[int, bool], ArmatureHierarchy] = {}
+    
+    BONE_DATA_PREFIX = "BoneData:"
+    
+    def __init__(self, bone_names: list[str], bone_parent_names: list[str | None], parents: dict[str, str | None], signature=None):
+        """bone_names and bone_parent_names follow arm.bones, parents is the hierarchy used for export"""
+        self.signature = signature
+        self.parents = parents
+        children_counts = collections.Counter(parent for parent in bone_parent_names if parent)
+        
+        # Same order as the queue in the original clean_bone_list():
+        # a bone is taken once its parent was taken, otherwise it goes to the back.
+        self.order: list[str] = []
+        done = set()
+        queue = collections.deque(bone_names)
+        stalled = 0
+        while queue and stalled <= len(queue):
+            name = queue.popleft()
+            parent = parents[name]
+            if parent is None or parent in done:
+                done.add(name)
+                self.order.append(name)
+                stalled = 0
+            else:
+                queue.append(name)
+                stalled += 1 # Stop on parent cycles instead of looping forever
+        
+        self.paths: dict[str, str] = {}
+        for name in self.order:
+            parent = parents[name]
+            self.paths[name] = self.paths[parent] + '/' + name if parent else name
+        
+        self.is_alone = {name: children_counts[name] == 0 for name in bone_names}
+        self.is_serial_number = {name: bool(common.has_serial_number(name)) for name in bone_names}
+        self.is_japanese = {name: self._is_japanese(name) for name in bone_names}
+        self.is_ik = {}
+        for name in bone_names:
+            name_low = name.lower()
+            self.is_ik[name] = '_ik_' in name_low or name_low.endswith('_nub') or name.endswith('Nub')
+    
+    @classmethod
+    def get(cls, arm: bpy.types.Armature, use_armature_property: bool = False) -> ArmatureHierarchy:
+        bones = arm.bones
+        bone_data = cls._get_bone_data(arm) if use_armature_property else ()
+        signature = (
+            tuple(bone.name for bone in bones),
+            tuple(bone.parent.name if bone.parent else None for bone in bones),
+            bone_data,
+        )
+        key = (arm.as_pointer(), use_armature_property)
+        hierarchy = cls._cache.get(key)
+        if hierarchy is None or hierarchy.signature != signature:
+            bone_names, bone_parent_names, _ = signature
+            hierarchy = cls(bone_names, bone_parent_names, cls._get_parents(*signature), signature)
+            cls._cache[key] = hierarchy
+        return hierarchy
+    
+    @classmethod
+    def _get_bone_data(cls, arm: bpy.types.Armature) -> tuple[tuple[int, str], ...]:
+        """("BoneData:<i>", value) armature properties, ordered by i"""
+        bone_data = []
+        for key in arm.keys():
+            if not key.startswith(cls.BONE_DATA_PREFIX):
+                continue
+            index = key[len(cls.BONE_DATA_PREFIX):]
+            if not index.isdigit() or str(int(index)) != index or int(index) >= 9999:
+                continue
+            value = arm[key]
+            if isinstance(value, str):
+                bone_data.append((int(index), value))
+        return tuple(sorted(bone_data))
+    
+    @staticmethod
+    def _get_parents(bone_names, bone_parent_names, bone_data) -> dict[str, str | None]:
+        bone_name_set = set(bone_names)
+        parents = {}
+        for _, value in bone_data:
+            elems = value.split(",")
+            if len(elems) != 5:
+                continue
+            if elems[0] in bone_name_set:
+                parents[elems[0]] = elems[2] if elems[2] in bone_name_set else None
+        for name, parent in zip(bone_names, bone_parent_names):
+            if name not in parents:
+                parents[name] = parent
+        return parents
+    
+    @staticmethod
+    def _is_japanese(string: str) -> bool:
+        for ch in string:
+            name = unicodedata.name(ch)
+            if 'CJK UNIFIED' in name or 'HIRAGANA' in name or 'KATAKANA' in name:
+                return True
+        return False
+    
+    def filter(self, is_remove_serial_number_bone=True, is_remove_japanese_bone=True,
+               is_remove_alone_bone=True, is_remove_ik_bone=True, keyed_bone_names: set[str] | None = None) -> list[str]:
+        """Names of the bones to export, in processing order (parents before children).
+        
+        keyed_bone_names removes unkeyed bones when it is not None.
+        """
+        names = []
+        for name in self.order:
+            if is_remove_serial_number_bone and self.is_serial_number[name]:
+                continue
+            if is_remove_japanese_bone and self.is_japanese[name]:
+                continue
+            if keyed_bone_names is not None and name not in keyed_bone_names:
+                continue
+            if self.parents[name] is None:
+                if is_remove_alone_bone and self.is_alone[name]:
+                    continue
+            elif is_remove_ik_bone and self.is_ik[name]:
+                continue
+            names.append(name)
+        return names
+
+
+class TrackCache:
+    """In-session LRU cache of finished bone tracks (channels after cleaning and reduction).
+    
+    A track is stored under a fingerprint of everything it was computed from: the
+    export settings and sampled frames, plus the FCurves, rest matrix and unkeyed pose
+    values of the bone, of its Blender ancestors and of its export parent and that
+    parent's ancestors. Re-exporting after editing a few bones therefore only samples
+    those bones and their children again.
+    
+    Bones whose pose also depends on constraints, drivers or FCurve modifiers along
+    that chain are never cached, neither is anything while NLA strips are evaluated.
+    Neither are the bones an IK or Spline IK constraint moves from below, as their
+    pose follows the target's animation.
+    """
+    CHANNEL_BYTES = 512 # Rough size of a ChannelKeys and its four arrays
+    KEYFRAME_BYTES = 20
+    STATIC_PROPS = ('location', 'rotation_quaternion', 'rotation_euler', 'rotation_axis_angle', 'scale')
+    
+    _entries: collections.OrderedDict[bytes, tuple[dict, int]] = collections.OrderedDict()
+    _size = 0
+    _bone_data_path_pattern = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]')
+    
+    @classmethod
+    def get(cls, key: bytes | None) -> dict | None:
+        if key is None or key not in cls._entries:
+            return None
+        cls._entries.move_to_end(key)
+        return cls._entries[key][0]
+    
+    @classmethod
+    def put(cls, key: bytes | None, channels: dict, max_bytes: int):
+        if key is None:
+            return
+        size = 256 + sum(cls.CHANNEL_BYTES + cls.KEYFRAME_BYTES * len(keys) for keys in channels.values())
+        if key in cls._entries:
+            cls._size -= cls._entries.pop(key)[1]
+        cls._entries[key] = (channels, size)
+        cls._size += size
+        while cls._size > max_bytes and cls._entries:
+            cls._size -= cls._entries.popitem(last=False)[1][1]
+    
+    @classmethod
+    def clear(cls):
+        cls._entries.clear()
+        cls._size = 0
+    
+    @classmethod
+    def get_keys(cls, obj: bpy.types.Object, bones: list[bpy.types.Bone], bone_parents: dict[str, bpy.types.Bone], settings: tuple) -> dict[str, bytes | None]:
+        """Fingerprint of each bone's track, None for bones that can not be cached"""
+        anim = obj.animation_data
+        if anim and anim.use_nla and any(track.strips and not track.mute for track in anim.nla_tracks):
+            return {bone.name: None for bone in bones}
+        
+        bone_fcurves = collections.defaultdict(list)
+        action = anim.action if anim else None
+        for fcurve in (action.fcurves if action else ()):
+            bone_name = cls._get_data_path_bone(fcurve.data_path)
+            if bone_name is not None:
+                bone_fcurves[bone_name].append(fcurve)
+        driven = {cls._get_data_path_bone(fcurve.data_path) for fcurve in (anim.drivers if anim else ())}
+        ik_chains = cls._get_ik_chain_bones(obj)
+        
+        settings_hash = hashlib.blake2b(repr((
+            settings, obj.data.pose_position,
+            (anim.action_extrapolation, anim.action_blend_type, anim.action_influence) if anim else None,
+        )).encode('utf-8'), digest_size=16).digest()
+        
+        digests: dict[str, bytes | None] = {}
+        def bone_digest(name: str) -> bytes | None:
+            if name in digests:
+                return digests[name]
+            digests[name] = None # Also guards against parent cycles
+            pose_bone = obj.pose.bones.get(name)
+            if pose_bone is None or len(pose_bone.constraints) or name in driven or name in ik_chains:
+                return None
+            bone = pose_bone.bone
+            parent_digest = b''
+            if bone.parent:
+                parent_digest = bone_digest(bone.parent.name)
+                if parent_digest is None:
+                    return None
+            
+            keyed = set()
+            digest = hashlib.blake2b(digest_size=16)
+            for fcurve in bone_fcurves.get(name, ()):
+                if len(fcurve.modifiers):
+                    return None
+                digest.update(cls._get_fcurve_digest(fcurve))
+                keyed.add(fcurve.data_path[fcurve.data_path.rfind('.') + 1:] + f'[{fcurve.array_index}]')
+            static_values = [
+                (prop, index, value)
+                for prop in cls.STATIC_PROPS
+                for index, value in enumerate(getattr(pose_bone, prop))
+                if f'{prop}[{index}]' not in keyed
+            ]
+            digest.update(repr((
+                name, pose_bone.rotation_mode, static_values,
+                bone.use_inherit_rotation, getattr(bone, 'inherit_scale', None), bone.use_local_location,
+            )).encode('utf-8'))
+            digest.update(np.array(bone.matrix_local, dtype=np.float64).tobytes())
+            digest.update(parent_digest)
+            digests[name] = digest.digest()
+            return digests[name]
+        
+        keys = {}
+        for bone in bones:
+            own_digest = bone_digest(bone.name)
+            parent = bone_parents[bone.name]
+            parent_digest = bone_digest(parent.name) if parent else b''
+            if own_digest is None or parent_digest is None:
+                keys[bone.name] = None
+            else:
+                keys[bone.name] = hashlib.blake2b(settings_hash + own_digest + parent_digest, digest_size=16).digest()
+        return keys
+    
+    @staticmethod
+    def _get_ik_chain_bones(obj: bpy.types.Object) -> set[str]:
+        """Names of the bones moved by IK and Spline IK constraints of their descendants"""
+        chain_bones = set()
+        for pose_bone in obj.pose.bones:
+            for constraint in pose_bone.constraints:
+                if constraint.type not in {'IK', 'SPLINE_IK'}:
+                    continue
+                # chain_count 0 is the whole chain up to the root; one extra bone covers use_tail
+                remaining = constraint.chain_count + 1 if constraint.chain_count else -1
+                bone = pose_bone
+                while bone and remaining != 0:
+                    chain_bones.add(bone.name)
+                    bone = bone.parent
+                    remaining -= 1
+        return chain_bones
+    
+    @classmethod
+    def _get_data_path_bone(cls, data_path: str) -> str | None:
+        match = cls._bone_data_path_pattern.match(data_path)
+        return re.sub(r'\\(.)', r'\1', match.group(1)) if match else None
+    
+    @staticmethod
+    def _get_fcurve_digest(fcurve: bpy.types.FCurve) -> bytes:
+        keyframe_points = fcurve.keyframe_points
+        count = len(keyframe_points)
+        digest = hashlib.blake2b(repr((
+            fcurve.data_path, fcurve.array_index, fcurve.mute, fcurve.extrapolation, count
+        )).encode('utf-8'), digest_size=16)
+        if count:
+            for attr, size, dtype in (
+                ('co', 2, np.float32), ('handle_left', 2, np.float32), ('handle_right', 2, np.float32),
+                ('interpolation', 1, np.int32), ('easing', 1, np.int32),
+                ('back', 1, np.float32), ('amplitude', 1, np.float32), ('period', 1, np.float32),
+            ):
+                values = np.empty(count * size, dtype=dtype)
+                keyframe_points.foreach_get(attr, values)
+                digest.update(values.tobytes())
+        return digest.digest()
+
+
+class SampleCache:
+    """Converted pose samples of every bone on every frame of a range, in a .npy file next to the .blend.
+    
+    Files are keyed by the TrackCache fingerprints of all bones (action FCurves, rest
+    pose, unkeyed values) together with the frame range, scale and parent source, so
+    exports that only differ in their optimization settings share one file. Rotations
+    are stored before fix_rotation_flips(), which depends on the frames that are picked.
+    Files are opened with np.load(mmap_mode='r'), only the requested rows are read.
+    """
+    FOLDER_SUFFIX = '.anm_samples'
+    COMPONENTS = 11 # loc xyz, rot wxyz, scale xyz, valid
+    
+    def __init__(self, folder: str, prefix: str, key: bytes, bone_names: list[str], frame_count: int):
+        self.folder = folder
+        self.prefix = prefix
+        self.path = os.path.join(folder, f'{prefix}-{key.hex()}.npy')
+        self.bone_indices = {name: i for i, name in enumerate(bone_names)}
+        self.shape = (frame_count, len(bone_names), self.COMPONENTS)
+    
+    @classmethod
+    def get(cls, obj: bpy.types.Object, bone_parents: dict[str, bpy.types.Bone], frame_start: int, frame_end: int,
+            scale: float, bone_parent_from: str) -> SampleCache | None:
+        """Cache of obj's current action, None if the .blend is unsaved or some bone can not be fingerprinted"""
+        blend_path = bpy.data.filepath
+        anim = obj.animation_data
+        if not blend_path or frame_end < frame_start or not (anim and anim.action):
+            return None
+        
+        bones = list(obj.data.bones)
+        settings = ('samples', frame_start, frame_end, scale, bone_parent_from)
+        keys = TrackCache.get_keys(obj, bones, bone_parents, settings)
+        if any(key is None for key in keys.values()):
+            return None
+        key = hashlib.blake2b(b''.join(keys[bone.name] for bone in bones), digest_size=16).digest()
+        
+        folder = os.path.splitext(blend_path)[0] + cls.FOLDER_SUFFIX
+        prefix = re.sub(r'[^\w.-]', '_', f'{obj.name}-{anim.action.name}')
+        return cls(folder, prefix, key, [bone.name for bone in bones], frame_end - frame_start + 1)
+    
+    @staticmethod
+    def get_frame_indices(frames, frame_start: int, frame_end: int) -> np.ndarray | None:
+        """Row of each frame in a cache of frame_start..frame_end, None unless all are whole frames inside it"""
+        frames = np.asarray(frames, dtype=np.float64)
+        if not len(frames) or frames.min() < frame_start or frames.max() > frame_end or (frames != np.round(frames)).any():
+            return None
+        return (frames - frame_start).astype(np.intp)
+    
+    def load(self) -> np.ndarray | None:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            data = np.load(self.path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        return data if data.shape == self.shape and data.dtype == np.float32 else None
+    
+    def save(self, locs, rots, scls, valid) -> np.ndarray:
+        """Write the samples, replacing older files of the same object and action, and return them as one array"""
+        data = np.concatenate([locs, rots, scls, valid[..., None].astype(np.float32)], axis=2)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'wb') as file:
+                np.save(file, data)
+            os.replace(temp_path, self.path)
+            stale_pattern = re.compile(re.escape(self.prefix) + r'-[0-9a-f]{32}\.npy')
+            for name in os.listdir(self.folder):
+                path = os.path.join(self.folder, name)
+                if stale_pattern.fullmatch(name) and path != self.path:
+                    os.remove(path)
+        except OSError:
+            pass # The cache is only an optimization, the export goes on without it
+        return data
+
+
+class KeyframeTransfer:
+    """Copies whole channels of keyframes into an Anm.Keyframe[] with one memmove.
+    
+    Anm.Keyframe is a struct of four float32 (time, value, inTangent, outTangent), so a
+    (n, 4) float32 array has the same memory layout as a Keyframe[] of length n.
+    The layout is verified once with a round trip; if anything does not match,
+    is_supported() returns False and callers set the fields one by one.
+    """
+    # GCHandle.Alloc, AddrOfPinnedObject, ToInt64 and Free
+    INTEROP_CALLS = 4
+    
+    _is_supported: bool | None = None
+    
+    @classmethod
+    def is_supported(cls) -> bool:
+        if cls._is_supported is None:
+            try:
+                cls._is_supported = cls._check_layout()
+            except Exception:
+                cls._is_supported = False
+        return cls._is_supported
+    
+    @classmethod
+    def _check_layout(cls) -> bool:
+        import clr  # type: ignore
+        from System.Runtime.InteropServices import Marshal  # type: ignore
+        
+        keyframe_type = clr.GetClrType(Anm.Keyframe)
+        if not keyframe_type.IsValueType or Marshal.SizeOf(keyframe_type) != 16:
+            return False
+        
+        probe = Array[Anm.Keyframe](2)
+        rows = np.arange(1, 9, dtype=np.float32).reshape(2, 4)
+        cls.copy(probe, rows)
+        for keyframe, (time, value, in_tangent, out_tangent) in zip(probe, rows.tolist()):
+            if (keyframe.time, keyframe.value, keyframe.inTangent, keyframe.outTangent) != (time, value, in_tangent, out_tangent):
+                return False
+        return True
+    
+    @staticmethod
+    def copy(keyframes, rows: np.ndarray):
+        """Copy (time, value, inTangent, outTangent) rows into a Keyframe[] of the same length"""
+        from System.Runtime.InteropServices import GCHandle, GCHandleType  # type: ignore
+        
+        data = np.ascontiguousarray(rows, dtype='<f4')
+        if not data.size:
+            return
+        handle = GCHandle.Alloc(keyframes, GCHandleType.Pinned)
+        try:
+            ctypes.memmove(handle.AddrOfPinnedObject().ToInt64(), data.ctypes.data, data.nbytes)
+        finally:
+            handle.Free()
+
+
+class PoseSampler:
+    """Batched pose sampling shared by the ALL and DIRECT export paths.
+    
+    All pose matrices of a frame are read with a single ``foreach_get`` into a
+    (frames x bones x 4 x 4) block. Each parent is inverted once per frame, and the
+    ``compat.convert_bl_to_cm_*`` conversions and the loc/rot/scale decomposition
+    are applied to the whole block as array operations.
+    
+    The compat conversions are captured as 16x16 linear operators by feeding them
+    the basis matrices, so the batched path stays in sync with ``compat``.
+    """
+    _operators: dict[str, np.ndarray] | None = None
+    CONVERT_BLOCK_FRAMES = 256
+    
+    def __init__(self, pose: bpy.types.Pose, bones: list[bpy.types.Bone], bone_parents: dict[str, bpy.types.Bone]):
+        self.pose = pose
+        pose_names = [pose_bone.name for pose_bone in pose.bones]
+        pose_index = {name: i for i, name in enumerate(pose_names)}
+        
+        needed: dict[str, int] = {}
+        for bone in bones:
+            needed.setdefault(bone.name, len(needed))
+        parents: dict[str, int] = {}
+        for bone in bones:
+            parent = bone_parents[bone.name]
+            if parent:
+                parents.setdefault(parent.name, len(parents))
+                needed.setdefault(parent.name, len(needed))
+        
+        self.names = list(needed.keys())
+        self.bone_slots = np.array([needed[bone.name] for bone in bones], dtype=np.intp)
+        self.parent_indices = np.array([needed[name] for name in parents], dtype=np.intp)
+        self.bone_parent_slots = np.array(
+            [parents[bone_parents[bone.name].name] if bone_parents[bone.name] else -1 for bone in bones],
+            dtype=np.intp
+        )
+        self.singular_parents = np.zeros((0, len(self.parent_indices)), dtype=bool)
+        
+        self._pose_index = np.array([pose_index[name] for name in self.names], dtype=np.intp)
+        self._buffer = np.empty(len(pose_names) * 16, dtype=np.float32)
+
+    @classmethod
+    def is_supported(cls) -> bool:
+        return bool(cls._get_operators())
+
+    @classmethod
+    def _get_operators(cls) -> dict[str, np.ndarray]:
+        if cls._operators is None:
+            operators = {}
+            functions = {
+                'bone_rotation': compat.convert_bl_to_cm_bone_rotation,
+                'bone_space'   : compat.convert_bl_to_cm_bone_space,
+                'space'        : compat.convert_bl_to_cm_space,
+            }
+            probe = compat.mul(Matrix.Translation((0.25, -0.5, 1.5)), mathutils.Euler((0.3, -1.1, 2.4), 'XYZ').to_matrix().to_4x4())
+            for key, func in functions.items():
+                operator = np.empty((16, 16), dtype=np.float64)
+                for i in range(16):
+                    basis = Matrix(((0.0,) * 4,) * 4)
+                    basis[i // 4][i % 4] = 1.0
+                    operator[:, i] = np.array(func(basis), dtype=np.float64).reshape(16)
+                # Only linear conversions can be batched this way.
+                expected = np.array(func(probe.copy()), dtype=np.float64).reshape(16)
+                if not np.allclose(operator @ np.array(probe, dtype=np.float64).reshape(16), expected, atol=1e-5):
+                    operators = {}
+                    break
+                operators[key] = operator
+            cls._operators = operators
+        return cls._operators
+
+    def allocate(self, frame_count: int) -> np.ndarray:
+        return np.empty((frame_count, len(self.names), 4, 4), dtype=np.float32)
+
+    def read(self, out: np.ndarray):
+        """Read the current pose matrices (row-major) of the sampled bones into out"""
+        self.pose.bones.foreach_get('matrix', self._buffer)
+        # foreach_get returns the matrices column-major
+        out[:] = self._buffer.reshape(-1, 4, 4)[self._pose_index].transpose(0, 2, 1)
+
+    def allocate_samples(self, frame_count: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Empty (locs, rots, scls, valid) with shapes (frames, bones, 3|4|3) and (frames, bones).
+        
+        Samples are float32, the precision of the pose matrices and of the written file.
+        """
+        bone_count = len(self.bone_slots)
+        return (
+            np.empty((frame_count, bone_count, 3), dtype=np.float32),
+            np.empty((frame_count, bone_count, 4), dtype=np.float32),
+            np.empty((frame_count, bone_count, 3), dtype=np.float32),
+            np.empty((frame_count, bone_count), dtype=bool),
+        )
+    
+    def convert(self, matrices: np.ndarray, scale: float) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Convert sampled pose matrices into CM3D2 local space.
+        
+        Returns (locs, rots, scls, valid) as allocate_samples() does. Quaternions are
+        stored as w, x, y, z.
+        """
+        samples = self.allocate_samples(len(matrices))
+        singular_parents = np.empty((len(matrices), len(self.parent_indices)), dtype=bool)
+        for start in range(0, len(matrices), self.CONVERT_BLOCK_FRAMES):
+            self.convert_into(matrices[start:start + self.CONVERT_BLOCK_FRAMES], scale, samples, start)
+            singular_parents[start:start + self.CONVERT_BLOCK_FRAMES] = self.singular_parents
+        self.singular_parents = singular_parents
+        return samples
+    
+    def convert_into(self, matrices: np.ndarray, scale: float, samples, start: int):
+        """Convert one block of frames into samples[start:start + len(matrices)].
+        
+        Afterwards singular_parents holds the flags of this block. Blocks should be at
+        most CONVERT_BLOCK_FRAMES long, which bounds the float64 temporaries.
+        """
+        locs, rots, scls, valid = samples
+        block = slice(start, start + len(matrices))
+        locs[block], rots[block], scls[block], valid[block] = self._convert_block(matrices, scale)
+
+    def _convert_block(self, matrices: np.ndarray, scale: float):
+        operators = self._get_operators()
+        frame_count = len(matrices)
+        
+        pose_mats = matrices[:, self.bone_slots].astype(np.float64)
+        pose_mats = self._apply(operators['bone_rotation'], pose_mats)
+        
+        parent_mats = matrices[:, self.parent_indices].astype(np.float64)
+        determinants = np.linalg.det(parent_mats)
+        self.singular_parents = ~np.isfinite(determinants) | (determinants == 0.0)
+        parent_mats[self.singular_parents] = np.identity(4)
+        parent_inverses = np.linalg.inv(parent_mats)
+        
+        has_parent = self.bone_parent_slots >= 0
+        valid = np.ones((frame_count, len(self.bone_slots)), dtype=bool)
+        if np.any(has_parent):
+            parent_slots = self.bone_parent_slots[has_parent]
+            child_mats = np.matmul(parent_inverses[:, parent_slots], pose_mats[:, has_parent])
+            pose_mats[:, has_parent] = self._apply(operators['bone_space'], child_mats)
+            valid[:, has_parent] = ~self.singular_parents[:, parent_slots]
+        if not np.all(has_parent):
+            pose_mats[:, ~has_parent] = self._apply(operators['space'], pose_mats[:, ~has_parent])
+        
+        locs = pose_mats[..., :3, 3] * scale
+        basis = pose_mats[..., :3, :3]
+        scls = np.sqrt(np.sum(basis * basis, axis=-2))
+        rots = self.matrix_to_quaternion(basis)
+        return locs, rots, scls, valid
+
+    @staticmethod
+    def _apply(operator: np.ndarray, mats: np.ndarray) -> np.ndarray:
+        shape = mats.shape
+        return (mats.reshape(-1, 16) @ operator.T).reshape(shape)
+
+    @staticmethod
+    def matrix_to_quaternion(basis: np.ndarray) -> np.ndarray:
+        """Vectorized ``Matrix.to_quaternion()``, returns (..., 4) as w, x, y, z"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lengths = np.sqrt(np.sum(basis * basis, axis=-2, keepdims=True))
+            unit = np.where(lengths != 0.0, basis / lengths, 0.0)
+            negative = np.linalg.det(unit) < 0.0
+            unit[negative] = -unit[negative]
+            
+            # Blender stores matrices column-major, m[i][j] below matches its source
+            m = np.swapaxes(unit, -1, -2)
+            m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+            m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+            m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+            
+            quats = np.empty(basis.shape[:-2] + (4,), dtype=np.float64)
+            cases = (
+                # (mask, trace, major axis, sign flip, (w, a, b) numerators)
+                ((m22 < 0.0) & (m00 > m11) , 1.0 + m00 - m11 - m22, 1, m12 < m21, (m12 - m21, m01 + m10, m20 + m02)),
+                ((m22 < 0.0) & ~(m00 > m11), 1.0 - m00 + m11 - m22, 2, m20 < m02, (m20 - m02, m01 + m10, m12 + m21)),
+                ((m22 >= 0.0) & (m00 < -m11), 1.0 - m00 - m11 + m22, 3, m01 < m10, (m01 - m10, m20 + m02, m12 + m21)),
+                ((m22 >= 0.0) & ~(m00 < -m11), 1.0 + m00 + m11 + m22, 0, False, (m12 - m21, m20 - m02, m01 - m10)),
+            )
+            for mask, trace, axis, flip, numerators in cases:
+                s = 2.0 * np.sqrt(trace)
+                s = np.where(flip, -s, s)
+                q = np.empty(quats.shape, dtype=np.float64)
+                q[..., axis] = 0.25 * s
+                others = [i for i in range(4) if i != axis]
+                for i, numerator in zip(others, numerators):
+                    q[..., i] = numerator / s
+                degenerate = (trace == 1.0) & np.all(q[..., others] == 0.0, axis=-1)
+                q[degenerate, axis] = 1.0
+                quats[mask] = q[mask]
+            
+            norms = np.linalg.norm(quats, axis=-1, keepdims=True)
+            quats = np.where(norms != 0.0, quats / norms, quats)
+        return quats
+
+    @staticmethod
+    def fix_rotation_flips(rots: np.ndarray, valid: np.ndarray):
+        """Fix rotations that jump to alternate representations, in place.
+        
+        Same rule as the per-bone path: negate when the rotation difference to the
+        previous valid sample of the bone is more than 5 radians.
+        """
+        bone_count = rots.shape[1]
+        prev_rots = np.zeros((bone_count, 4), dtype=rots.dtype)
+        has_prev = np.zeros(bone_count, dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for frame_rots, frame_valid in zip(rots, valid):
+                cos_half = (np.sum(prev_rots * frame_rots, axis=-1)
+                            / (np.linalg.norm(prev_rots, axis=-1) * np.linalg.norm(frame_rots, axis=-1)))
+                angle = 2.0 * np.arccos(np.clip(cos_half, -1.0, 1.0))
+                flip = frame_valid & has_prev & (angle > 5.0)
+                frame_rots[flip] = -frame_rots[flip]
+                prev_rots[frame_valid] = frame_rots[frame_valid]
+                has_prev |= frame_valid
+
+def read_anm(source) -> tuple[int, dict[str, dict[int, np.ndarray]]]:
+    """Read a CM3D2_ANIM file from a path, bytes or binary file.
+    
+    Returns (version, tracks) where tracks maps each track path to its channels, and each
+    channel id to a read-only float32 array of (time, value, inTangent, outTangent) rows.
+    The file is read with a single read and keyframe blocks are views into that buffer.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        buffer = bytes(source)
+    elif hasattr(source, 'read'):
+        buffer = source.read()
+    else:
+        buffer = Path(source).read_bytes()
+    
+    signature, offset = _read_str(buffer, 0)
+    if signature != 'CM3D2_ANIM':
+        raise common.CM3D2ImportError(f"Not a CM3D2_ANIM file (signature '{signature}')")
+    version, = _INT32.unpack_from(buffer, offset)
+    offset += _INT32.size
+    
+    tracks: dict[str, dict[int, np.ndarray]] = {}
+    channels = None
+    while offset < len(buffer):
+        tag = buffer[offset]
+        offset += 1
+        if tag == 0:
+            break
+        elif tag == 1:
+            path, offset = _read_str(buffer, offset)
+            channels = tracks.setdefault(path, {})
+        elif channels is not None:
+            count, = _INT32.unpack_from(buffer, offset)
+            offset += _INT32.size
+            channels[tag] = np.frombuffer(buffer, dtype='<f4', count=count * 4, offset=offset).reshape(count, 4)
+            offset += count * 16
+        else:
+            raise common.CM3D2ImportError(f"Unexpected channel {tag} before the first track at offset {offset - 1}")
+    return version, tracks
+
+
+def _read_str(buffer: bytes, offset: int) -> tuple[str, int]:
+    """Read a 7-bit length prefixed UTF-8 string, as written by common.write_str"""
+    length = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+    return buffer[offset:offset + length].decode('utf-8'), offset + length
+
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_TEXT_KEYFRAME_FIELDS = ('frame', 'f0', 'f1', 'f2')
+
+
+def iter_json_object(text: str):
+    """Yield the (key, value) members of a top-level JSON object, decoding one value at a time.
+    
+    Accepts exactly what json.loads() accepts for an object, but never holds more than
+    one decoded member.
+    """
+    skip = _JSON_WHITESPACE.match
+    index = skip(text, 0).end()
+    if text[index:index + 1] != '{':
+        raise json.JSONDecodeError("Expecting '{'", text, index)
+    index = skip(text, index + 1).end()
+    if text[index:index + 1] == '}':
+        index += 1
+    else:
+        while True:
+            if text[index:index + 1] != '"':
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, index)
+            key, index = _JSON_DECODER.raw_decode(text, index)
+            index = skip(text, index).end()
+            if text[index:index + 1] != ':':
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, index)
+            index = skip(text, index + 1).end()
+            value, index = _JSON_DECODER.raw_decode(text, index)
+            yield key, value
+            
+            index = skip(text, index).end()
+            delimiter = text[index:index + 1]
+            if delimiter == '}':
+                index += 1
+                break
+            if delimiter != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+            index = skip(text, index + 1).end()
+    if skip(text, index).end() != len(text):
+        raise json.JSONDecodeError("Extra data", text, index)
+
+
+def pack_text_tracks(text: str) -> list[bytes]:
+    """Packed tracks of an AnmData JSON document"""
+    # Each bone is decoded and packed on its own. Like json.loads(), a repeated
+    # bone name keeps its first position and its last value.
+    tracks: dict[str, bytes] = {}
+    for base_bone_name, bone_data in iter_json_object(text):
+        tracks[base_bone_name] = pack_text_track(bone_data)
+    return list(tracks.values())
+
+
+def pack_text_track(bone_data: dict) -> bytes:
+    """One AnmData bone as a CM3D2_ANIM track, each channel's (frame, f0, f1, f2) rows packed in one call"""
+    buffer = io.BytesIO()
+    buffer.write(_BOOL.pack(True))
+    common.write_str(buffer, bone_data['path'])
+    get_row = operator.itemgetter(*_TEXT_KEYFRAME_FIELDS)
+    for channel_id, channel in bone_data['channels'].items():
+        buffer.write(_CHANNEL_HEADER.pack(int(channel_id), len(channel)))
+        buffer.write(_get_rows_struct(len(channel)).pack(*itertools.chain.from_iterable(map(get_row, channel))))
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=256)
+def _get_rows_struct(count: int) -> struct.Struct:
+    return struct.Struct(f'<{count * 4}f')
+
+
+ANM_DATA_FORMAT_VERSION = 1
+_ANM_DATA_CHANNEL_KEY = re.compile(r'track(\d+)_channel(\d+)')
+
+
+def save_anm_data(file, tracks: list[tuple[str, str, dict[int, np.ndarray]]]):
+    """Write binary AnmData, the columnar counterpart of the AnmData JSON, to a path or binary file.
+    
+    tracks holds (bone name, track path, {channel id: rows}) in track order. The file is
+    an uncompressed .npz with:
+        format_version        int32 scalar
+        bones, paths          unicode arrays, one entry per track
+        track<i>_channel<id>  little-endian float32 (n, 4) rows of (frame, f0, f1, f2),
+                              stored in channel write order
+    No object arrays are used, so it loads with allow_pickle=False.
+    """
+    arrays = {
+        'format_version': np.array(ANM_DATA_FORMAT_VERSION, dtype=np.int32),
+        'bones': np.array([bone_name for bone_name, _, _ in tracks], dtype=str),
+        'paths': np.array([path for _, path, _ in tracks], dtype=str),
+    }
+    for track_index, (_, _, channels) in enumerate(tracks):
+        for channel_id, rows in channels.items():
+            arrays[f'track{track_index}_channel{int(channel_id)}'] = np.asarray(rows, dtype='<f4').reshape(-1, 4)
+    np.savez(file, **arrays)
+
+
+def load_anm_data(source) -> list[tuple[str, str, dict[int, np.ndarray]]]:
+    """Read binary AnmData written by save_anm_data(), returns (bone name, track path, {channel id: rows})"""
+    with np.load(source, allow_pickle=False) as data:
+        if 'format_version' not in data.files or int(data['format_version']) > ANM_DATA_FORMAT_VERSION:
+            raise common.CM3D2ExportError("Unsupported binary AnmData file")
+        tracks = [(str(bone_name), str(path), {}) for bone_name, path in zip(data['bones'].tolist(), data['paths'].tolist())]
+        for key in data.files:
+            match = _ANM_DATA_CHANNEL_KEY.fullmatch(key)
+            if match is None:
+                continue
+            track_index, channel_id = int(match.group(1)), int(match.group(2))
+            if track_index >= len(tracks):
+                raise common.CM3D2ExportError(f"Binary AnmData channel '{key}' has no track")
+            tracks[track_index][2][channel_id] = data[key].astype('<f4').reshape(-1, 4)
+    return tracks
+
+
+def pack_anm_data_track(path: str, channels: dict[int, np.ndarray]) -> bytes:
+    """One binary AnmData track as a CM3D2_ANIM track"""
+    buffer = io.BytesIO()
+    buffer.write(_BOOL.pack(True))
+    common.write_str(buffer, path)
+    for channel_id, rows in channels.items():
+        buffer.write(_CHANNEL_HEADER.pack(channel_id, len(rows)))
+        buffer.write(rows.tobytes())
+    return buffer.getvalue()
+
+
+class ChannelKeys:
+    """Keyframes of one channel as arrays sorted by time.
+    
+    times are float64 (they are compared and scaled while reducing), values and
+    tangents are float32 like the written file.
+    """
+    __slots__ = 'times', 'values', 'tangents_in', 'tangents_out'
+    
+    def __init__(self, times, values, tangents_in=None, tangents_out=None):
+        self.times = np.ascontiguousarray(times, dtype=np.float64)
+        self.values = np.ascontiguousarray(values, dtype=np.float32)
+        count = len(self.times)
+        self.tangents_in = np.zeros(count, dtype=np.float32) if tangents_in is None else np.ascontiguousarray(tangents_in, dtype=np.float32)
+        self.tangents_out = np.zeros(count, dtype=np.float32) if tangents_out is None else np.ascontiguousarray(tangents_out, dtype=np.float32)
+    
+    def __len__(self) -> int:
+        return len(self.times)
+    
+    def select(self, mask: np.ndarray) -> ChannelKeys:
+        return ChannelKeys(self.times[mask], self.values[mask], self.tangents_in[mask], self.tangents_out[mask])
+
+
+class Track(dict):
+    def __init__(self):
+        super().__init__()
+        self['LOC'] = {}
+        self['ROT'] = {}
+        self['SCL'] = {}
+    @property
+    def loc_dict(self) -> dict[float, Vector]:
+        return self['LOC']
+    @property
+    def rot_dict(self) -> dict[float, Quaternion]:
+        return self['ROT']
+    @property
+    def scl_dict(self) -> dict[float, Vector]:
+        return self['SCL']
+
+
+class TrackRecorder:
+    """Records the samples of one bone into a Track, dropping redundant keyframes when cleaning"""
+    __slots__ = 'builder', 'key_frame_count', 'is_keyframe_clean', 'track', 'same_locs', 'same_rots', 'same_scls'
+    
+    def __init__(self, builder: AnmBuilder, key_frame_count: int, is_keyframe_clean: bool):
+        self.builder = builder
+        self.key_frame_count = key_frame_count
+        self.is_keyframe_clean = is_keyframe_clean
+        self.track = Track()
+        self.same_locs: list[KeyFrame] = []
+        self.same_rots: list[KeyFrame] = []
+        self.same_scls: list[KeyFrame] = []
+    
+    def add(self, key_frame_index: int, time: float, loc: Vector, rot: Quaternion, scl: Vector):
+        track = self.track
+        if (not self.is_keyframe_clean 
+            or key_frame_index == 0 
+            or key_frame_index == self.key_frame_count - 1
+            or len(track.loc_dict) == 0):
+            
+            track.loc_dict[time] = loc.copy()
+            track.rot_dict[time] = rot.copy()
+            track.scl_dict[time] = scl.copy()
+
+            if self.is_keyframe_clean:
+                self.same_locs.append(KeyFrame(time, loc.copy()))
+                self.same_rots.append(KeyFrame(time, rot.copy()))
+                self.same_scls.append(KeyFrame(time, scl.copy()))
+        else:
+            determine_new_keyframe = self.builder.determine_new_keyframe
+            
+            self.same_locs, new_keydict = determine_new_keyframe(time, self.same_locs.copy(), loc)
+            track.loc_dict.update(new_keydict)
+            
+            self.same_rots, new_keydict = determine_new_keyframe(time, self.same_rots.copy(), rot)
+            track.rot_dict.update(new_keydict)
+            
+            self.same_scls, new_keydict = determine_new_keyframe(time, self.same_scls.copy(), scl)
+            track.scl_dict.update(new_keydict)
+
+
 class KeyFrame:
     __slots__ = 'time', 'value', 'slope'
     
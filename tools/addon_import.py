@@ -0,0 +1,45 @@
+"""Helpers for scripts that drive anm_export.py from `blender --background`.
+
+anm_export.py lives inside the CM3D2 Converter add-on and uses relative imports,
+so scripts have to import it through the installed add-on package.
+"""
+from __future__ import annotations
+
+import importlib
+
+
+def import_anm_export(addon_name: str | None = None):
+    """Enable the CM3D2 Converter add-on if needed and return its anm_export module"""
+    import addon_utils
+
+    if addon_name is None:
+        for module in addon_utils.modules():
+            if module.__file__ and _has_anm_export(module):
+                addon_name = module.__name__
+                break
+        else:
+            raise RuntimeError("Could not find an installed add-on that contains anm_export.py")
+
+    is_loaded, is_enabled = addon_utils.check(addon_name)
+    if not is_enabled:
+        addon_utils.enable(addon_name, default_set=False)
+    return importlib.import_module(f"{addon_name}.anm_export")
+
+
+def _has_anm_export(module) -> bool:
+    import os
+    return os.path.exists(os.path.join(os.path.dirname(module.__file__), 'anm_export.py'))
+
+
+class Reporter:
+    """Stand-in for the operator's report() when the builder runs without UI"""
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+        self.messages: list[tuple[str, str]] = []
+
+    def report(self, type, message):
+        level = next(iter(type)) if type else 'INFO'
+        self.messages.append((level, str(message)))
+        if self.verbose or level in {'ERROR', 'WARNING'}:
+            print(f"[{level}] {message}")
@@ -0,0 +1,302 @@
+"""Export .anm files headlessly from a JSON job manifest.
+
+Run with a plain Python interpreter to spread the jobs over several Blender
+processes, one per .blend file:
+
+    python tools/anm_export_batch.py manifest.json --blender /path/to/blender --processes 4 --report report.json
+
+Each Blender process runs this same script as its job runner:
+
+    blender --background file.blend --python tools/anm_export_batch.py -- --run jobs.json --result result.json
+
+Manifest layout (relative paths are resolved against the manifest's folder):
+
+    {
+        "defaults": {"export_method": "DIRECT_OPTIMIZED", "optimization_mode": "RDP"},
+        "jobs": [
+            {
+                "blend": "rigs/body.blend",
+                "armature": "Armature",
+                "action": "walk",
+                "frame_start": 0,
+                "frame_end": 120,
+                "output": "out/walk.anm",
+                "backend": "NATIVE",
+                "backup": false,
+                "options": {"rdp_tolerance": 0.005}
+            }
+        ]
+    }
+
+"defaults" and "options" hold AnmBuilder settings (the data attributes its __init__
+defines), options override defaults.
+frame_start / frame_end default to the action's frame range, "backend" is either
+NATIVE (the add-on's own writer) or SERIALIZER (CM3D2.Serialization).
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import traceback
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+BACKENDS = {'NATIVE', 'SERIALIZER'}
+# Builder attributes that are wired up by the runner, not by the manifest
+RESERVED_OPTIONS = {'reporter', 'profiler', 'frame_start', 'frame_end'}
+
+
+def load_manifest(path: str) -> list[dict]:
+    """Read a manifest and return its jobs with defaults merged and paths made absolute"""
+    with open(path, 'r', encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    defaults = manifest.get('defaults', {})
+    jobs = []
+    for index, job in enumerate(manifest.get('jobs', [])):
+        for key in ('blend', 'armature', 'output'):
+            if key not in job:
+                raise ValueError(f"Job {index} has no '{key}'")
+        job = dict(job)
+        job['index'] = index
+        job['blend'] = os.path.join(base_dir, job['blend'])
+        job['output'] = os.path.join(base_dir, job['output'])
+        job['options'] = {**defaults, **job.get('options', {})}
+        job.setdefault('backend', 'NATIVE')
+        job.setdefault('backup', False)
+        if job['backend'] not in BACKENDS:
+            raise ValueError(f"Job {index} has an unknown backend '{job['backend']}'")
+        jobs.append(job)
+    return jobs
+
+
+# ---------------------------------------------------------------------------
+# Driver, runs outside of Blender
+# ---------------------------------------------------------------------------
+
+def parse_driver_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help="JSON job manifest")
+    parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'), help="Blender executable (default: $BLENDER or 'blender')")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="Number of Blender processes run at once")
+    parser.add_argument('--addon', default=None, help="Add-on module name (auto-detected by default)")
+    parser.add_argument('--profile', action='store_true', help="Record per-stage timings for every job")
+    parser.add_argument('--report', default=None, help="JSON report path (default: print a summary only)")
+    return parser.parse_args(argv)
+
+
+def group_by_blend(jobs: list[dict]) -> dict[str, list[dict]]:
+    groups: dict[str, list[dict]] = {}
+    for job in jobs:
+        groups.setdefault(job['blend'], []).append(job)
+    return groups
+
+
+def run_blend(blend: str, jobs: list[dict], args) -> list[dict]:
+    """Run one Blender process for all jobs of a .blend file and return their results"""
+    with tempfile.TemporaryDirectory(prefix='anm_export_batch_') as temp_dir:
+        jobs_path = os.path.join(temp_dir, 'jobs.json')
+        result_path = os.path.join(temp_dir, 'result.json')
+        with open(jobs_path, 'w', encoding='utf-8') as jobs_file:
+            json.dump(jobs, jobs_file)
+
+        command = [
+            args.blender, '--background', blend,
+            '--python', os.path.abspath(__file__),
+            '--', '--run', jobs_path, '--result', result_path,
+        ]
+        if args.addon:
+            command += ['--addon', args.addon]
+        if args.profile:
+            command.append('--profile')
+
+        start = time.perf_counter()
+        process = subprocess.run(command, capture_output=True, text=True, errors='replace')
+        elapsed = time.perf_counter() - start
+
+        if os.path.exists(result_path):
+            with open(result_path, 'r', encoding='utf-8') as result_file:
+                results = json.load(result_file)
+        else:
+            results = []
+
+    # Jobs that never reported back died with the process
+    finished = {result['index'] for result in results}
+    for job in jobs:
+        if job['index'] not in finished:
+            results.append({
+                'index': job['index'],
+                'blend': blend,
+                'output': job['output'],
+                'status': 'failed',
+                'error': f"Blender exited with code {process.returncode} before the job finished",
+                'log': process.stderr[-4000:] or process.stdout[-4000:],
+            })
+    for result in results:
+        result['process_seconds'] = elapsed
+    return results
+
+
+def main_driver(argv) -> int:
+    args = parse_driver_args(argv)
+    jobs = load_manifest(args.manifest)
+    groups = group_by_blend(jobs)
+
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(args.processes, len(groups)))) as executor:
+        futures = [executor.submit(run_blend, blend, blend_jobs, args) for blend, blend_jobs in groups.items()]
+        for future in futures:
+            for result in future.result():
+                results.append(result)
+                status = result['status'].upper()
+                seconds = result.get('seconds')
+                timing = f" {seconds:.2f}s" if seconds is not None else ""
+                print(f"[{status}] {result['output']}{timing}" + (f": {result['error']}" if result.get('error') else ""))
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda result: result['index'])
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    print(f"{len(results) - failed} of {len(results)} jobs exported from {len(groups)} files in {elapsed:.2f}s")
+
+    if args.report:
+        report = {
+            'manifest': os.path.abspath(args.manifest),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'seconds': elapsed,
+            'processes': args.processes,
+            'jobs': results,
+        }
+        with open(args.report, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2)
+    return 1 if failed else 0
+
+
+# ---------------------------------------------------------------------------
+# Job runner, runs inside Blender
+# ---------------------------------------------------------------------------
+
+def parse_runner_args(argv):
+    parser = argparse.ArgumentParser(description="Run anm export jobs inside Blender")
+    parser.add_argument('--run', required=True, help="JSON list of jobs for the open .blend file")
+    parser.add_argument('--result', required=True, help="JSON path the job results are written to")
+    parser.add_argument('--addon', default=None, help="Add-on module name (auto-detected by default)")
+    parser.add_argument('--profile', action='store_true', help="Record per-stage timings for every job")
+    return parser.parse_args(argv)
+
+
+def get_builder_options(builder) -> set[str]:
+    """Option names a manifest may set: the data attributes AnmBuilder.__init__ defines.
+    
+    Methods, properties, private attributes and anything callable are left out,
+    so a manifest can not replace behaviour, only settings.
+    """
+    return {
+        name for name, value in vars(builder).items()
+        if not name.startswith('_') and name not in RESERVED_OPTIONS and not callable(value)
+    }
+
+
+def make_builder(anm_export, reporter, job: dict, action):
+    builder = anm_export.AnmBuilder(reporter=reporter)
+    options = get_builder_options(builder)
+    for name, value in job['options'].items():
+        if name not in options:
+            raise ValueError(f"Unknown AnmBuilder option '{name}'")
+        if callable(value):
+            raise ValueError(f"AnmBuilder option '{name}' can not be callable")
+        setattr(builder, name, value)
+    frame_start, frame_end = action.frame_range
+    builder.frame_start = int(job.get('frame_start', frame_start))
+    builder.frame_end = int(job.get('frame_end', frame_end))
+    return builder
+
+
+def run_job(anm_export, context, job: dict, is_profile: bool) -> dict:
+    import bpy
+    from addon_import import Reporter
+
+    obj = bpy.data.objects.get(job['armature'])
+    if obj is None or obj.type != 'ARMATURE':
+        raise ValueError(f"There is no armature object named '{job['armature']}'")
+
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    if 'action' in job:
+        action = bpy.data.actions.get(job['action'])
+        if action is None:
+            raise ValueError(f"There is no action named '{job['action']}'")
+        obj.animation_data.action = action
+    action = obj.animation_data.action
+    if action is None:
+        raise ValueError(f"'{job['armature']}' has no active action")
+
+    context.view_layer.objects.active = obj
+    reporter = Reporter()
+    builder = make_builder(anm_export, reporter, job, action)
+    builder.profiler = anm_export.ExportProfiler() if is_profile else None
+
+    os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+    file = anm_export.common.open_temporary(job['output'], 'wb', is_backup=job['backup'])
+    with file:
+        if job['backend'] == 'NATIVE':
+            builder.write_anm(context, file)
+        else:
+            anm = builder.build_anm(context)
+            with anm_export.ExportProfiler.measure(builder.profiler, 'serialize'):
+                anm_export.serialize_to_file(anm, file)
+
+    result = {
+        'bytes': os.path.getsize(job['output']),
+        'messages': reporter.messages,
+    }
+    if builder.profiler:
+        result['profile'] = builder.profiler.to_dict()
+    return result
+
+
+def main_runner(argv) -> int:
+    import bpy
+    from addon_import import import_anm_export
+
+    args = parse_runner_args(argv)
+    with open(args.run, 'r', encoding='utf-8') as jobs_file:
+        jobs = json.load(jobs_file)
+
+    anm_export = import_anm_export(args.addon)
+    context = bpy.context
+
+    results = []
+    for job in jobs:
+        result = {'index': job['index'], 'blend': job['blend'], 'output': job['output']}
+        start = time.perf_counter()
+        try:
+            result.update(run_job(anm_export, context, job, args.profile))
+            result['status'] = 'ok'
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+            result['log'] = traceback.format_exc()
+        result['seconds'] = time.perf_counter() - start
+        results.append(result)
+
+        # Keep finished jobs even if a later one takes Blender down
+        with open(args.result, 'w', encoding='utf-8') as result_file:
+            json.dump(results, result_file)
+    return 1 if any(result['status'] != 'ok' for result in results) else 0
+
+
+if __name__ == '__main__':
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    if '--run' in argv:
+        sys.exit(main_runner(argv))
+    else:
+        sys.exit(main_driver(argv))
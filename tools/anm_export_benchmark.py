@@ -0,0 +1,360 @@
+"""Benchmark every AnmBuilder stage on synthetic rigs.
+
+Run inside Blender:
+
+    blender --background --python tools/anm_export_benchmark.py -- \
+        --bones 250 --depth 8 --frames 3000 --key-density 1.0 --output bench.json
+
+A synthetic armature and action are generated in the current session, then each
+export method / optimization mode is timed stage by stage. Results are written as
+JSON so throughput (bone-frames per second) and peak memory can be tracked
+across exporter versions.
+
+Cases are timed with per-bone (mathutils) sampling, the exporter's default, or
+with the batched pose sampler when --batched-sampling is given. With
+--compare-sampling every case is also exported with both samplers: the keys must
+match within --sampling-epsilon, and whether the written files are byte-identical
+is recorded. With --verify the written file of every case is read back
+and checked against the track data it was built from. The exit code is 1 if any
+comparison or verification fails.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import io
+import json
+import math
+import time
+import argparse
+import hashlib
+import platform
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bpy  # noqa: E402
+import numpy as np  # noqa: E402
+from addon_import import import_anm_export, Reporter  # noqa: E402
+
+
+# (export_method, optimization_mode, variant), variants set the builder options below
+EXPORT_CASES = [
+    ('ALL'             , None      , None              ),
+    ('KEYED'           , None      , None              ),
+    ('KEYED'           , None      , 'READ_ONLY'       ),
+    ('DIRECT_OPTIMIZED', 'SIMPLE'  , None              ),
+    ('DIRECT_OPTIMIZED', 'DENSITY' , None              ),
+    ('DIRECT_OPTIMIZED', 'MOTION'  , None              ),
+    ('DIRECT_OPTIMIZED', 'RDP'     , None              ),
+    ('DIRECT_OPTIMIZED', 'RDP'     , 'PER_CHANNEL_KEYS'),
+    ('DIRECT_OPTIMIZED', 'RDP'     , 'SHARED_KEYS'     ),
+    ('DIRECT_OPTIMIZED', 'HERMITE' , None              ),
+]
+CASE_VARIANTS = {
+    'READ_ONLY'       : {'is_keyed_read_only': True},
+    'PER_CHANNEL_KEYS': {'is_per_channel_keys': True},
+    'SHARED_KEYS'     : {'is_per_channel_keys': False},
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bones', type=int, default=120, help="Number of bones in the synthetic armature")
+    parser.add_argument('--depth', type=int, default=6, help="Maximum hierarchy depth")
+    parser.add_argument('--frames', type=int, default=600, help="Number of frames in the action")
+    parser.add_argument('--key-density', type=float, default=1.0, help="Fraction of frames that have keyframes (0-1]")
+    parser.add_argument('--repeat', type=int, default=1, help="Timing runs per stage, the fastest is reported")
+    parser.add_argument('--cases', nargs='*', default=None, help="Subset of cases, e.g. ALL DIRECT_OPTIMIZED:RDP DIRECT_OPTIMIZED:RDP:SHARED_KEYS")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass for peak memory")
+    parser.add_argument('--batched-sampling', action='store_true', help="Time the batched pose sampler instead of per-bone sampling")
+    parser.add_argument('--compare-sampling', action='store_true', help="Check batched sampling against per-bone sampling")
+    parser.add_argument('--verify', action='store_true', help="Read every written file back and compare it with its track data")
+    parser.add_argument('--sampling-epsilon', type=float, default=1e-5, help="Largest key value difference accepted by --compare-sampling")
+    parser.add_argument('--addon', default=None, help="Add-on module name (auto-detected by default)")
+    parser.add_argument('--label', default='', help="Free-form label stored with the results, e.g. a version")
+    parser.add_argument('--output', default=None, help="JSON output path (default: print to stdout)")
+    return parser.parse_args(argv)
+
+
+def build_synthetic_rig(context, bone_count: int, depth: int, frame_count: int, key_density: float):
+    """Create an armature of chains hanging off one root, with a quaternion/location action"""
+    arm = bpy.data.armatures.new("anm_benchmark")
+    obj = bpy.data.objects.new("anm_benchmark", arm)
+    context.scene.collection.objects.link(obj)
+    context.view_layer.objects.active = obj
+    obj.select_set(True)
+
+    chain_length = max(depth - 1, 1)
+    names = ["Bip01"] + [f"Bip01 bone_{i:04d}" for i in range(1, bone_count)]
+    parents = [None] + [0 if (i - 1) % chain_length == 0 else i - 1 for i in range(1, bone_count)]
+
+    bpy.ops.object.mode_set(mode='EDIT')
+    edit_bones = []
+    for i, name in enumerate(names):
+        edit_bone = arm.edit_bones.new(name)
+        chain, link = divmod(i - 1, chain_length) if i else (0, -1)
+        edit_bone.head = (chain * 0.1, 0.0, (link + 1) * 0.1)
+        edit_bone.tail = (chain * 0.1, 0.05, (link + 1) * 0.1)
+        if parents[i] is not None:
+            edit_bone.parent = edit_bones[parents[i]]
+        edit_bones.append(edit_bone)
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    # Also provide the BoneData properties used by the 'ARMATURE_PROPERTY' parent source
+    for i, name in enumerate(names):
+        parent_name = names[parents[i]] if parents[i] is not None else "None"
+        arm[f"BoneData:{i}"] = f"{name},1,{parent_name},0 0 0,0 0 0 1"
+
+    step = max(1, round(1.0 / max(key_density, 1e-6)))
+    key_frames = list(range(0, frame_count, step))
+    if key_frames[-1] != frame_count - 1:
+        key_frames.append(frame_count - 1)
+
+    obj.animation_data_create()
+    action = bpy.data.actions.new("anm_benchmark")
+    obj.animation_data.action = action
+    for i, name in enumerate(names):
+        data_path = f'pose.bones["{name}"]'
+        phase = i * 0.37
+        props = [('rotation_quaternion', 4)]
+        if i == 0:
+            props.append(('location', 3))
+        for prop, size in props:
+            for axis in range(size):
+                fcurve = action.fcurves.new(f'{data_path}.{prop}', index=axis, action_group=name)
+                fcurve.keyframe_points.add(len(key_frames))
+                co = []
+                for frame in key_frames:
+                    value = math.sin(frame * 0.05 * (axis + 1) + phase) * 0.3
+                    if prop == 'rotation_quaternion' and axis == 0:
+                        value += 1.0
+                    co.extend((frame, value))
+                fcurve.keyframe_points.foreach_set('co', co)
+                fcurve.update()
+
+    context.scene.frame_start = 0
+    context.scene.frame_end = frame_count - 1
+    return obj
+
+
+def measure(func, repeat: int, with_memory: bool):
+    best = None
+    result = None
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    stats = {'seconds': best}
+    if with_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        func()
+        stats['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, stats
+
+
+def get_case_name(export_method, optimization_mode, variant) -> str:
+    return ':'.join(part for part in (export_method, optimization_mode, variant) if part)
+
+
+def make_builder(anm_export, context, export_method, optimization_mode, variant):
+    builder = anm_export.AnmBuilder(reporter=Reporter())
+    builder.export_method = export_method
+    builder.frame_start = context.scene.frame_start
+    builder.frame_end = context.scene.frame_end
+    builder.is_keyframe_clean = export_method == 'ALL'
+    if optimization_mode:
+        builder.optimization_mode = optimization_mode
+    for name, value in CASE_VARIANTS.get(variant, {}).items():
+        setattr(builder, name, value)
+    return builder
+
+
+def compare_track_data(expected: dict, actual: dict, epsilon: float) -> dict:
+    """Compare two {bone: {channel_id: ChannelKeys}} results key by key"""
+    mismatches = []
+    max_error = 0.0
+    for bone_name in sorted(set(expected) | set(actual)):
+        expected_channels = expected.get(bone_name, {})
+        actual_channels = actual.get(bone_name, {})
+        for channel_id in sorted(set(expected_channels) | set(actual_channels), key=int):
+            expected_keys = expected_channels.get(channel_id)
+            actual_keys = actual_channels.get(channel_id)
+            where = f"{bone_name} channel {int(channel_id)}"
+            if expected_keys is None or actual_keys is None:
+                mismatches.append(f"{where}: only in one result")
+            elif len(expected_keys) != len(actual_keys):
+                mismatches.append(f"{where}: {len(expected_keys)} keys vs {len(actual_keys)}")
+            elif len(expected_keys):
+                if not np.allclose(expected_keys.times, actual_keys.times, rtol=0.0, atol=1e-9):
+                    mismatches.append(f"{where}: key times differ")
+                    continue
+                error = float(np.abs(expected_keys.values.astype(np.float64) - actual_keys.values).max())
+                max_error = max(max_error, error)
+                if error > epsilon:
+                    mismatches.append(f"{where}: values differ by {error:.3g}")
+    return {
+        'matches': not mismatches,
+        'max_error': max_error,
+        'mismatches': mismatches[:20],
+        'mismatch_count': len(mismatches),
+    }
+
+
+def compare_sampling(anm_export, context, obj, export_method, optimization_mode, variant, epsilon) -> dict:
+    """Export the case with per-bone and with batched sampling and compare keys and written bytes"""
+    exports = []
+    for is_batched_sampling in (False, True):
+        builder = make_builder(anm_export, context, export_method, optimization_mode, variant)
+        builder.is_batched_sampling = is_batched_sampling
+        bone_parents = builder.get_bone_parents(obj.data, builder.bone_parent_from == 'ARMATURE_PROPERTY')
+        bones, anm_data_raw = builder.collect_raw_animation_data(context, obj, bone_parents)
+        track_data = builder.get_track_data(anm_data_raw)
+        if builder.is_optimizing_channel_keys:
+            builder.optimize_channel_keys(track_data.values(), context.scene.render.fps)
+        buffer = io.BytesIO()
+        time_step = 1 / context.scene.render.fps / builder.time_scale
+        builder.write_anm_data(buffer, bone_parents, bones, track_data, time_step, auto_smooth=builder.is_auto_smooth)
+        exports.append((track_data, buffer.getvalue()))
+    (expected, expected_bytes), (actual, actual_bytes) = exports
+    comparison = compare_track_data(expected, actual, epsilon)
+    comparison['identical_bytes'] = expected_bytes == actual_bytes
+    return comparison
+
+
+def run_case(anm_export, context, obj, export_method, optimization_mode, variant, args, with_memory):
+    builder = make_builder(anm_export, context, export_method, optimization_mode, variant)
+    builder.is_batched_sampling = args.batched_sampling
+
+    arm = obj.data
+    stages = {}
+
+    def stage(name, func):
+        result, stages[name] = measure(func, args.repeat, with_memory)
+        return result
+
+    bone_parents = stage('get_bone_parents', lambda: builder.get_bone_parents(
+        arm, builder.bone_parent_from == 'ARMATURE_PROPERTY'))
+    keyed_bones = builder.get_keyed_bones(arm, obj.animation_data.action.fcurves)
+    bones = stage('clean_bone_list', lambda: builder.clean_bone_list(arm, bone_parents, keyed_bones))
+    bones, anm_data_raw = stage('collect_raw_animation_data', lambda: builder.collect_raw_animation_data(
+        context, obj, bone_parents))
+    track_data = stage('get_track_data', lambda: builder.get_track_data(anm_data_raw))
+    if builder.is_optimizing_channel_keys:
+        # Reduces track_data in place, so it is timed once
+        stages['optimize_channel_keys'] = measure(
+            lambda: builder.optimize_channel_keys(track_data.values(), context.scene.render.fps), 1, False)[1]
+
+    time_step = 1 / context.scene.render.fps / builder.time_scale
+    auto_smooth = builder.is_auto_smooth
+    anm = stage('assemble_anm', lambda: builder.assemble_anm(
+        bone_parents, bones, track_data, time_step, auto_smooth=auto_smooth))
+
+    def serialize():
+        from CM3D2.Serialization import CM3D2Serializer  # type: ignore
+        from System.IO import MemoryStream  # type: ignore
+        stream = MemoryStream()
+        CM3D2Serializer().Serialize(stream, anm)
+        return bytes(stream.ToArray())
+    serialized = stage('serialize', serialize)
+
+    def write_native():
+        buffer = io.BytesIO()
+        builder.write_anm_data(buffer, bone_parents, bones, track_data, time_step, auto_smooth=auto_smooth)
+        return buffer.getvalue()
+    native = stage('write_anm_data', write_native)
+
+    sampled_frames = context.scene.frame_end - context.scene.frame_start + 1
+    keyframe_count = sum(len(keyframes) for channels in track_data.values() for keyframes in channels.values())
+    sampling_seconds = stages['collect_raw_animation_data']['seconds']
+    result = {
+        'export_method': export_method,
+        'optimization_mode': optimization_mode,
+        'variant': variant,
+        'stages': stages,
+        'bones_in': len(arm.bones),
+        'bones_out': len(bones),
+        'keyframes_in': builder.count_source_keyframes(bones, obj.animation_data.action.fcurves),
+        'keyframes_out': keyframe_count,
+        'output_bytes': len(native),
+        'native_matches_serializer': native == serialized,
+        'bone_frames_per_second': len(bones) * sampled_frames / sampling_seconds if sampling_seconds else None,
+        'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+    }
+    if args.verify:
+        mismatches = builder.verify_anm_file(
+            io.BytesIO(native), bone_parents, bones, track_data, time_step, auto_smooth=auto_smooth)
+        result['verification'] = {
+            'matches': not mismatches,
+            'mismatches': mismatches[:20],
+            'mismatch_count': len(mismatches),
+        }
+    if args.compare_sampling and export_method != 'KEYED': # KEYED reads FCurves, it does not sample poses
+        result['sampling_comparison'] = compare_sampling(
+            anm_export, context, obj, export_method, optimization_mode, variant, args.sampling_epsilon)
+    return result
+
+
+def main(argv):
+    args = parse_args(argv)
+    anm_export = import_anm_export(args.addon)
+    context = bpy.context
+
+    obj = build_synthetic_rig(context, args.bones, args.depth, args.frames, args.key_density)
+
+    cases = EXPORT_CASES
+    if args.cases:
+        wanted = set(args.cases)
+        cases = [case for case in cases if any(get_case_name(*case[:length]) in wanted for length in (1, 2, 3))]
+
+    with open(anm_export.__file__, 'rb') as module_file:
+        module_hash = hashlib.sha1(module_file.read()).hexdigest()
+
+    results = {
+        'label': args.label,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'blender': bpy.app.version_string,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'anm_export_sha1': module_hash,
+        'config': {
+            'bones': args.bones,
+            'depth': args.depth,
+            'frames': args.frames,
+            'key_density': args.key_density,
+            'repeat': args.repeat,
+            'batched_sampling': args.batched_sampling,
+            'sampling_epsilon': args.sampling_epsilon if args.compare_sampling else None,
+        },
+        'results': [],
+    }
+    for export_method, optimization_mode, variant in cases:
+        print(f"Benchmarking {get_case_name(export_method, optimization_mode, variant)}")
+        results['results'].append(run_case(anm_export, context, obj, export_method, optimization_mode, variant, args, not args.no_memory))
+
+    failed = []
+    for result in results['results']:
+        name = get_case_name(result['export_method'], result['optimization_mode'], result['variant'])
+        verification = result.get('verification')
+        if verification and not verification['matches']:
+            failed.append(result)
+            print(f"Written file does not match for {name}: {verification['mismatch_count']} mismatches, e.g. {verification['mismatches'][0]}")
+        comparison = result.get('sampling_comparison')
+        if comparison and not comparison['matches']:
+            failed.append(result)
+            print(f"Batched sampling differs for {name}: {comparison['mismatch_count']} channels, e.g. {comparison['mismatches'][0]}")
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(text)
+    else:
+        print(text)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []))